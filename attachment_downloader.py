@@ -0,0 +1,125 @@
+# attachment_downloader.py
+
+# Parallel attachment downloader for confTraverse.py.
+#
+# A single requests.Session with a keep-alive connection pool is shared by a
+# pool of worker threads, so attachments of many pages are downloaded at the
+# same time without a new TLS handshake per file. Each file is streamed into
+# a temporary file next to its destination and renamed into place only once
+# it is complete, so an interrupted export never leaves truncated images.
+
+import os
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class AttachmentDownloader:
+    """
+    Downloads files over a pooled, authenticated session in background threads.
+
+    Parameters:
+    token       : str, bearer token sent with every request
+    certificate : str or bool, CA bundle used to verify the server (requests' verify)
+    workers     : int, number of parallel downloads (default: 8)
+    pool_size   : int, keep-alive connections kept per host (default: workers)
+    chunk_size  : int, bytes read per chunk while streaming (default: 1 MiB)
+    """
+
+    def __init__(self, token, certificate=True, workers=8, pool_size=None, chunk_size=1024 * 1024):
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+        self.session.verify = certificate
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self.downloaded = 0
+        self.bytes_downloaded = 0
+        self.failures = []
+
+    @classmethod
+    def from_auth_config(cls, auth_cfg, **kwargs):
+        """Creates a downloader from the auth section returned by confluence_auth.read_config."""
+        return cls(auth_cfg['TOKEN'], auth_cfg['CERTIFICATE'], **kwargs)
+
+    def download(self, url, filepath):
+        """
+        Downloads a single file and atomically moves it to filepath.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        directory = os.path.dirname(filepath) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".download-", suffix=".part")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with self.session.get(url, stream=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            size += len(chunk)
+            # mkstemp creates the file private to the user; attachments are ordinary export files
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def _download_job(self, url, filepath, label, on_complete):
+        try:
+            size = self.download(url, filepath)
+            if on_complete is not None:
+                on_complete(filepath)
+        except requests.exceptions.HTTPError as e:
+            print(f"      - HTTP Error downloading '{label}': {e}")
+            with self._lock:
+                self.failures.append((label, str(e)))
+            return None
+        except Exception as e:
+            print(f"      - General Error downloading '{label}': {e}")
+            with self._lock:
+                self.failures.append((label, str(e)))
+            return None
+
+        with self._lock:
+            self.downloaded += 1
+            self.bytes_downloaded += size
+        print(f"      - Downloaded '{label}' to {filepath}")
+        return filepath
+
+    def submit(self, url, filepath, label=None, on_complete=None):
+        """
+        Queues a download. on_complete(filepath) is called from the worker
+        thread once the file is in place; errors are printed and collected in
+        self.failures instead of being raised.
+
+        Returns:
+            concurrent.futures.Future: Resolves to filepath, or None on failure.
+        """
+        return self._executor.submit(self._download_job, url, filepath, label or os.path.basename(filepath), on_complete)
+
+    def close(self):
+        """Waits for all queued downloads and closes the session."""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        print(f"Downloaded {self.downloaded} attachment(s), {self.bytes_downloaded / 1e6:.1f} MB"
+              f"{f', {len(self.failures)} failed' if self.failures else ''}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
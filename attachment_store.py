@@ -0,0 +1,211 @@
+# attachment_store.py
+
+# Content-addressed store for downloaded Confluence attachments.
+#
+# Every attachment is stored once under its SHA-256 digest
+# (objects/ab/abcdef....png) and linked into the export tree under its
+# usual name, so an image attached to many pages takes disk space only once.
+# The index remembers which digest an attachment id/version resolved to, so
+# later runs (or other exports sharing the same store) can link the file
+# again without downloading it.
+#
+# index.json:
+#   {
+#     "attachments": {"<attachment id>:<version>": digest},
+#     "pages":       {page_id: {attachment title: digest}}
+#   }
+
+import os
+import sys
+import json
+import errno
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from export_manifest import file_sha256
+
+INDEX_FILENAME = "index.json"
+
+
+# Ways of placing a file at another path, cheapest first
+LINK_METHODS = ("hardlink", "reflink", "symlink", "copy")
+
+# ioctl request of a copy-on-write clone on Linux (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+
+def reflink_file(source, destination):
+    """
+    Creates destination as a copy-on-write clone of source: a separate file
+    that shares the data blocks until either is modified. Raises OSError
+    where the platform or filesystem does not support it.
+    """
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, destination)
+    except OSError:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+
+
+def link_file(source, destination, methods=("hardlink", "symlink", "copy")):
+    """
+    Places source at destination with the first of methods (see
+    LINK_METHODS) that works, e.g. a hardlink, falling back to a symlink
+    and finally to a copy (e.g. across filesystems). An existing destination
+    is replaced atomically.
+
+    Returns:
+        str: The method used: 'hardlink', 'reflink', 'symlink' or 'copy'.
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        method = "hardlink" if not os.path.islink(destination) else "symlink"
+        if method in methods:
+            return method
+
+    tmp_path = f"{destination}.link-{threading.get_ident()}"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    for method in methods:
+        try:
+            if method == "hardlink":
+                os.link(source, tmp_path)
+            elif method == "reflink":
+                reflink_file(source, tmp_path)
+            elif method == "symlink":
+                os.symlink(os.path.abspath(source), tmp_path)
+            elif method == "copy":
+                shutil.copy2(source, tmp_path)
+            else:
+                raise ValueError(f"Unknown link method '{method}'")
+            break
+        except OSError:
+            if method == methods[-1]:
+                raise
+    os.replace(tmp_path, destination)
+    return method
+
+
+class AttachmentStore:
+    """
+    Hash-addressed attachment objects with an id/version -> digest and a
+    page/title -> digest index. Thread-safe, so it can be used from the
+    downloader's worker threads.
+
+    Parameters:
+    store_dir : str, directory holding objects/ and index.json; can be shared
+                between several export directories
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.index_path = os.path.join(store_dir, INDEX_FILENAME)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.attachments = {}
+        self.pages = {}
+        self.reused = 0
+        self.deduplicated = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.attachments = data.get("attachments", {})
+            self.pages = data.get("pages", {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            print(f"Could not read attachment store index '{self.index_path}' ({e}). Starting a new index.")
+
+    def object_path(self, digest, title=""):
+        extension = os.path.splitext(title)[1].lower()
+        return os.path.join(self.objects_dir, digest[:2], digest + extension)
+
+    def lookup(self, attachment_id, version, title):
+        """
+        Returns the stored object path of an attachment version, or None if
+        it has to be downloaded.
+        """
+        with self._lock:
+            digest = self.attachments.get(f"{attachment_id}:{version}")
+        if digest is None:
+            return None
+        path = self.object_path(digest, title)
+        return path if os.path.exists(path) else None
+
+    def link_existing(self, attachment_id, version, page_id, title, filepath):
+        """
+        Links an already stored attachment version to filepath.
+
+        Returns:
+            bool: False if the attachment is not in the store yet.
+        """
+        path = self.lookup(attachment_id, version, title)
+        if path is None:
+            return False
+        link_file(path, filepath)
+        digest = os.path.splitext(os.path.basename(path))[0]
+        self._index_title(page_id, title, digest, filepath)
+        with self._lock:
+            self.reused += 1
+        return True
+
+    def staging_path(self, attachment_id, version):
+        """
+        Returns a private download location for an attachment version, so
+        same-named attachments of different pages never overwrite each other
+        while they are being downloaded.
+        """
+        staging_dir = os.path.join(self.store_dir, "staging")
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, f"{attachment_id}-{version}")
+
+    def add(self, staged_path, filepath, attachment_id, version, page_id, title):
+        """
+        Moves a freshly downloaded file into the store and links the stored
+        object to filepath. If the same content is already stored, the
+        download is dropped in favour of the existing object.
+
+        Returns:
+            str: The SHA-256 digest of the content.
+        """
+        digest = file_sha256(staged_path)
+        path = self.object_path(digest, title)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            if os.path.exists(path):
+                self.deduplicated += 1
+                os.remove(staged_path)
+            else:
+                os.replace(staged_path, path)
+            self.attachments[f"{attachment_id}:{version}"] = digest
+        link_file(path, filepath)
+        self._index_title(page_id, title, digest, filepath)
+        return digest
+
+    def _index_title(self, page_id, title, digest, filepath):
+        # Every page has its own attachments folder in the export, so
+        # same-named attachments of different pages are simply different files
+        with self._lock:
+            self.pages.setdefault(str(page_id), {})[title] = digest
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"attachments": self.attachments, "pages": self.pages}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.index_path)
+        print(f"Attachment store: {self.reused} attachment(s) linked without download, "
+              f"{self.deduplicated} duplicate download(s) merged.")
@@ -0,0 +1,93 @@
+# bench_extract.py
+
+# Compares the chapter extraction backends of conf2tex.py (BeautifulSoup on
+# lxml, and lxml directly) by parse + extract time per MB of HTML, on a
+# synthetic Confluence page export with a large table, or on the chapters
+# of a real HTML space export. Images are resolved but not placed.
+#
+# Usage:
+#   python bench_extract.py                        # synthetic page, 5,000 table rows
+#   python bench_extract.py --rows 50000
+#   python bench_extract.py SAF                    # chapters linked from SAF/index.html
+
+import io
+import os
+import time
+import argparse
+import tempfile
+import contextlib
+
+from conf2tex import CHAPTER_EXTRACTORS, get_chapter_links
+
+
+def write_synthetic_page(f, rows, columns=8):
+    """Writes a Confluence-style page export with navigation, a large table and a footer."""
+    f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>SAF : Requirements</title></head><body>\n'
+            '<div id="page"><div id="main-header"><div id="breadcrumb-section"><ol id="breadcrumbs">'
+            + "".join(f'<li><a href="index.html">Level {i}</a></li>' for i in range(5)) +
+            '</ol></div><h1 id="title-heading" class="pagetitle"><span>Requirements &amp; Traceability</span></h1></div>\n'
+            '<div id="content" class="view"><div id="main-content" class="wiki-content group">\n'
+            '<p>Intro with <strong>bold</strong>, <em>emphasis</em> and a <a href="other.html">link</a>.</p>\n'
+            '<p><img class="confluence-embedded-image" src="attachments/123/diagram%20one.png"></p>\n'
+            '<div class="table-wrap"><table class="confluenceTable"><tbody>\n')
+    f.write("<tr>" + "".join(f'<th class="confluenceTh">Column {c}</th>' for c in range(columns)) + "</tr>\n")
+    for r in range(rows):
+        f.write("<tr>" + "".join(f'<td class="confluenceTd"><p>R{r} C{c} value &lt;{r * c}&gt;</p></td>'
+                                 for c in range(columns)) + "</tr>\n")
+    f.write('</tbody></table></div>\n</div></div>\n'
+            '<div id="footer"><section class="footer-body"><p>Document generated by Confluence</p></section></div>\n'
+            '</div></body></html>\n')
+
+
+def bench(name, extractor, html_files, input_dir, repeat):
+    extract = CHAPTER_EXTRACTORS[extractor]
+    size_mb = sum(os.path.getsize(path) for path in html_files) / (1024 * 1024)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            chapters = [extract(path, input_dir) for path in html_files]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<8} {best:8.3f} s  {best / size_mb:8.3f} s/MB  {size_mb / best:8.2f} MB/s")
+    return chapters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark conf2tex chapter extraction backends.")
+    parser.add_argument("input_dir", nargs="?", default=None,
+                        help="Confluence HTML export to read the chapters from (default: a synthetic page)")
+    parser.add_argument("--rows", type=int, default=5000,
+                        help="Table rows of the synthetic page (default: 5000)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per backend; the best is reported (default: 3)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.input_dir:
+            input_dir = args.input_dir
+            with contextlib.redirect_stdout(io.StringIO()):
+                links = get_chapter_links(os.path.join(input_dir, "index.html")) or []
+            html_files = [os.path.join(input_dir, link) for link in links]
+        else:
+            input_dir = tmp_dir
+            html_files = [os.path.join(tmp_dir, "page.html")]
+            with open(html_files[0], "w", encoding="utf-8") as f:
+                write_synthetic_page(f, args.rows)
+            os.makedirs(os.path.join(tmp_dir, "attachments"))
+            open(os.path.join(tmp_dir, "attachments", "diagram one.png"), "wb").close()
+
+        size_mb = sum(os.path.getsize(path) for path in html_files) / (1024 * 1024)
+        print(f"{len(html_files)} chapter(s), {size_mb:.1f} MB of HTML\n")
+        results = {name: bench(name, name, html_files, input_dir, args.repeat)
+                   for name in sorted(CHAPTER_EXTRACTORS)}
+
+    soup, fast = results["soup"], results["lxml"]
+    mismatches = [a["source"] for a, b in zip(soup, fast)
+                  if a is None or b is None or (a["title"], a["images"]) != (b["title"], b["images"])]
+    if mismatches:
+        print(f"\nTitle or images differ between the backends for: {', '.join(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
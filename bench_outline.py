@@ -0,0 +1,57 @@
+# bench_outline.py
+
+# Compares the streaming outline parser of scribe.py with the DOTALL regex
+# it replaced, on an outline made by repeating a real one until it reaches
+# the requested size.
+#
+# Usage:
+#   python bench_outline.py                         # SAFARSEP_outline.md, 4 MB
+#   python bench_outline.py PMPoutline.md --mb 16
+
+import re
+import time
+import argparse
+
+from scribe import iter_outline
+
+
+def regex_parse_description(text):
+    """The original scribe.parse_description, kept here as the baseline."""
+    pages = []
+    matches = re.findall(r"^(#+)\s*(.*?)\n(.*?)(?=\n#+|\Z)", text, re.MULTILINE | re.DOTALL)
+    for match in matches:
+        pages.append({
+            "level": len(match[0]),
+            "title": match[1].strip(),
+            "content": match[2].strip(),
+            "parent_id": None
+        })
+    return pages
+
+
+def timed(label, parse, size_mb):
+    start = time.perf_counter()
+    pages = parse()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {elapsed:8.3f} s  {size_mb / elapsed:8.1f} MB/s  {len(pages):8d} page(s)")
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the outline parsers.")
+    parser.add_argument("outline", nargs="?", default="SAFARSEP_outline.md", help="Outline to repeat")
+    parser.add_argument("--mb", type=float, default=4.0, help="Approximate size of the test outline in MB (default: 4)")
+    args = parser.parse_args()
+
+    with open(args.outline, "r", encoding="utf-8") as f:
+        sample = f.read().rstrip("\n") + "\n\n"
+    text = sample * max(1, int(args.mb * 1e6 / len(sample.encode("utf-8"))))
+    size_mb = len(text.encode("utf-8")) / 1e6
+    print(f"Parsing {size_mb:.1f} MB built from '{args.outline}'\n")
+
+    timed("regex (DOTALL)", lambda: regex_parse_description(text), size_mb)
+    timed("streaming", lambda: list(iter_outline(text.splitlines())), size_mb)
+
+
+if __name__ == "__main__":
+    main()
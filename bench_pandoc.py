@@ -0,0 +1,65 @@
+# bench_pandoc.py
+
+# Compares HTML -> LaTeX throughput of the PandocConverter modes:
+# one pandoc process per page, batched pages in one process, a process pool,
+# and a process pool of batches.
+#
+# Usage:
+#   python bench_pandoc.py                 # synthetic pages
+#   python bench_pandoc.py SAF             # every *.html file of an HTML export
+#   python bench_pandoc.py --pages 400 --batch 20 --workers 8
+
+import os
+import glob
+import time
+import argparse
+
+from pandoc_converter import PandocConverter
+
+
+def synthetic_page(i):
+    """Returns a Confluence-like page with headings, lists and a table."""
+    rows = "".join(f"<tr><td>REQ-{i}-{r}</td><td>The system shall do thing {r}.</td></tr>" for r in range(20))
+    return (f"<h2>Section {i}</h2>"
+            f"<p>a. The SEP shall describe item {i} &amp; its <b>constraints</b>.</p>"
+            f"<ol><li>first</li><li>second<ol><li>nested</li></ol></li></ol>"
+            f"<table><tr><th>Id</th><th>Text</th></tr>{rows}</table>")
+
+
+def load_pages(args):
+    if args.input_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.input_dir, "*.html"))):
+            with open(path, "r", encoding="utf-8") as f:
+                pages.append(f.read())
+        return pages
+    return [synthetic_page(i) for i in range(args.pages)]
+
+
+def run(label, pages, workers, batch_size):
+    with PandocConverter(['--wrap=none'], workers=workers, batch_size=batch_size) as converter:
+        start = time.perf_counter()
+        results = converter.convert_many(pages)
+        elapsed = time.perf_counter() - start
+    failed = sum(1 for latex in results if latex is None)
+    print(f"{label:<24} {elapsed:8.2f} s  {len(pages) / elapsed:8.1f} pages/s  ({failed} failed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pandoc conversion modes.")
+    parser.add_argument("input_dir", nargs="?", help="Directory with *.html pages (default: synthetic pages)")
+    parser.add_argument("--pages", type=int, default=200, help="Number of synthetic pages (default: 200)")
+    parser.add_argument("--batch", type=int, default=20, help="Pages per pandoc invocation (default: 20)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Pool size (default: number of cores)")
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    print(f"Converting {len(pages)} page(s), batch size {args.batch}, {args.workers} worker(s)\n")
+    run("per-page", pages, 1, 1)
+    run("batched", pages, 1, args.batch)
+    run("pooled", pages, args.workers, 1)
+    run("pooled + batched", pages, args.workers, args.batch)
+
+
+if __name__ == "__main__":
+    main()
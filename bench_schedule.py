@@ -0,0 +1,103 @@
+# bench_schedule.py
+
+# Compares the streaming schedule reader of sync_dates.py with the
+# ET.parse + findall reader it replaced, on a synthetic MS Project XML
+# export with baselines, assignments and timephased data, as written for
+# a full programme schedule. Time and peak Python memory (tracemalloc) are
+# measured in separate runs.
+#
+# Usage:
+#   python bench_schedule.py                       # 20,000 tasks
+#   python bench_schedule.py --tasks 100000
+#   python bench_schedule.py --schedule "SAFAR Project Schedule.xml"
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from sync_dates import iter_schedule_tasks
+
+NAMESPACE = "http://schemas.microsoft.com/project"
+
+
+def findall_tasks(schedule_file):
+    """The original sync_dates reader, kept here as the baseline."""
+    root = ET.parse(schedule_file).getroot()
+    namespaces = {'ns': root.tag.split('}')[0].strip('{')} if '}' in root.tag else {}
+    tasks = []
+    for task in root.findall('.//ns:Task', namespaces):
+        tasks.append({
+            "name": task.findtext('ns:Name', default='N/A', namespaces=namespaces),
+            "notes": task.findtext('ns:Notes', default='N/A', namespaces=namespaces),
+            "start": task.findtext('ns:Start', default='N/A', namespaces=namespaces),
+            "finish": task.findtext('ns:Finish', default='N/A', namespaces=namespaces),
+            "outline_number": task.findtext('ns:OutlineNumber', default='N/A', namespaces=namespaces),
+            "outline_level": task.findtext('ns:OutlineLevel', default='N/A', namespaces=namespaces),
+        })
+    return tasks
+
+
+def write_synthetic_schedule(f, tasks, timephased_days=20):
+    """Writes an MS Project XML schedule with baselines and timephased assignment data."""
+    f.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Project xmlns="{NAMESPACE}">\n'
+            '<Name>Synthetic schedule</Name>\n<Tasks>\n')
+    for i in range(tasks):
+        day = 1 + i % 28
+        baselines = "".join(f"<Baseline><Number>{b}</Number><Start>2024-01-{day:02d}T08:00:00</Start>"
+                            f"<Finish>2024-02-{day:02d}T17:00:00</Finish><Work>PT80H0M0S</Work></Baseline>"
+                            for b in range(3))
+        f.write(f"<Task><UID>{i}</UID><ID>{i}</ID><Name>Task {i}</Name><OutlineNumber>1.{i}</OutlineNumber>"
+                f"<OutlineLevel>{3 + i % 4}</OutlineLevel><Start>2025-03-{day:02d}T08:00:00</Start>"
+                f"<Finish>2025-04-{day:02d}T17:00:00</Finish><Notes>{1000 + i}</Notes>{baselines}"
+                f"<ExtendedAttribute><FieldID>188743731</FieldID><Value>WP-{i % 50}</Value></ExtendedAttribute></Task>\n")
+    f.write("</Tasks>\n<Assignments>\n")
+    for i in range(tasks):
+        timephased = "".join(f"<TimephasedData><Type>1</Type><UID>{i}</UID><Start>2025-03-{1 + d % 28:02d}T08:00:00</Start>"
+                             f"<Finish>2025-03-{1 + d % 28:02d}T17:00:00</Finish><Unit>2</Unit><Value>PT8H0M0S</Value></TimephasedData>"
+                             for d in range(timephased_days))
+        f.write(f"<Assignment><UID>{i}</UID><TaskUID>{i}</TaskUID><ResourceUID>{i % 40}</ResourceUID>{timephased}</Assignment>\n")
+    f.write("</Assignments>\n</Project>\n")
+
+
+def measure(label, read, schedule_file, size_mb):
+    start = time.perf_counter()
+    count = sum(1 for _ in read(schedule_file))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _ in read(schedule_file):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<20} {elapsed:8.2f} s  {size_mb / elapsed:8.1f} MB/s  peak {peak / 1e6:8.1f} MB  {count:8d} task(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MS Project XML task readers.")
+    parser.add_argument("--schedule", help="Existing MS Project XML export (default: a synthetic one)")
+    parser.add_argument("--tasks", type=int, default=20000, help="Tasks in the synthetic schedule (default: 20000)")
+    args = parser.parse_args()
+
+    schedule_file = args.schedule
+    tmp_path = None
+    if schedule_file is None:
+        fd, tmp_path = tempfile.mkstemp(suffix=".xml")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            write_synthetic_schedule(f, args.tasks)
+        schedule_file = tmp_path
+
+    try:
+        size_mb = os.path.getsize(schedule_file) / 1e6
+        print(f"Reading {size_mb:.1f} MB from '{schedule_file}'\n")
+        measure("ET.parse + findall", findall_tasks, schedule_file, size_mb)
+        measure("iterparse (stream)", iter_schedule_tasks, schedule_file, size_mb)
+    finally:
+        if tmp_path is not None:
+            os.remove(tmp_path)
+
+
+if __name__ == "__main__":
+    main()
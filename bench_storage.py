@@ -0,0 +1,65 @@
+# bench_storage.py
+
+# Compares the built-in Markdown -> Confluence storage renderer of
+# confluence_storage.py with pandoc (one process per section, and all
+# distinct sections in one batched process) on the sections of real outlines.
+#
+# Usage:
+#   python bench_storage.py                              # SAFARSEP_outline.md and PMPoutline.md
+#   python bench_storage.py *.md --repeat 20 --pandoc-sections 50
+
+import time
+import argparse
+
+import pypandoc
+
+from scribe import parse_outline_file
+from confluence_storage import StorageRenderer, render_storage
+
+PANDOC_DELIMITER = "SCRIBEPANDOCBATCHDELIMITERQXZ"
+
+
+def pandoc_render(text):
+    return pypandoc.convert_text(text, "html", format="markdown", extra_args=["--wrap=none"])
+
+
+def pandoc_render_batch(texts):
+    joined = f"\n\n{PANDOC_DELIMITER}\n\n".join(texts)
+    return pypandoc.convert_text(joined, "html", format="markdown",
+                                 extra_args=["--wrap=none"]).split(f"<p>{PANDOC_DELIMITER}</p>")
+
+
+def timed(label, render, sections):
+    start = time.perf_counter()
+    results = render(sections)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f} s  {len(sections) / elapsed:10.1f} sections/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Markdown -> Confluence storage rendering.")
+    parser.add_argument("outlines", nargs="*", default=["SAFARSEP_outline.md", "PMPoutline.md"],
+                        help="Outlines whose sections are rendered")
+    parser.add_argument("--repeat", type=int, default=50,
+                        help="Times every section is rendered, as with many similar documents (default: 50)")
+    parser.add_argument("--pandoc-sections", type=int, default=40,
+                        help="Sections rendered by the per-section pandoc run (default: 40)")
+    args = parser.parse_args()
+
+    sections = [page["content"] for path in args.outlines for page in parse_outline_file(path)]
+    workload = sections * args.repeat
+    print(f"{len(sections)} distinct section(s), {len(workload)} rendered\n")
+
+    timed("built-in, no cache", lambda texts: [render_storage(t) for t in texts], workload)
+    renderer = StorageRenderer()
+    timed("built-in, cached", lambda texts: [renderer.render(t) for t in texts], workload)
+    print(f"{'':<28} {renderer.misses} rendered, {renderer.hits} from cache")
+
+    sample = sections[:args.pandoc_sections]
+    timed("pandoc, per section", lambda texts: [pandoc_render(t) for t in texts], sample)
+    timed("pandoc, one batch", pandoc_render_batch, sections)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# chapter_manifest.py
+
+# Local record of what a previous conf2tex.py run built, so an incremental
+# run only reconverts the chapters whose HTML changed since.
+#
+# The manifest is a JSON file in the LaTeX output directory:
+#   {
+#     "pandoc_args":    ["--wrap=none", "--toc-depth=3"],
+#     "extractor":      "soup",
+#     "image_settings": {"dpi": 200, ...} or null,
+#     "chapters":       {"ch1.html": {"mtime_ns": 1700000000000000000, "size": 1234, "sha256": "...",
+#                                     "tex_filename": "ch1.tex", "images": {"scan.png": "scan.tiff"}}}
+#   }
+#
+# 'images' maps the image files of the build to their attachment filenames,
+# which differ when image normalization converted the format.
+#
+# A chapter is current when its .tex file is still there and its source has
+# the recorded size and either the recorded mtime or, if only the mtime
+# moved (e.g. a fresh export of an unchanged page), the recorded digest.
+# Changing the pandoc arguments, the chapter extractor or the image
+# normalization settings makes every chapter stale.
+
+import os
+import json
+
+from export_manifest import file_sha256
+
+MANIFEST_FILENAME = "conf2tex_manifest.json"
+
+
+def files_identical(source_path, dest_path):
+    """
+    True if dest_path already holds the contents of source_path. Copies made
+    with shutil.copy2 keep the mtime, so the digests are only compared when
+    the sizes match but the mtimes do not.
+    """
+    try:
+        source_stat = os.stat(source_path)
+        dest_stat = os.stat(dest_path)
+    except OSError:
+        return False
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    return file_sha256(source_path) == file_sha256(dest_path)
+
+
+class ChapterManifest:
+    """
+    Sources, outputs and images of the chapters of the last build.
+
+    Parameters:
+    output_dir     : str, the LaTeX output directory holding the manifest file
+    pandoc_args    : list, pandoc arguments of this build
+    load           : bool, read the previous manifest (default: True); with False
+                     every chapter is treated as changed but a new manifest is
+                     still written on save()
+    image_settings : dict, ImageSettings.key() of this build, or None without
+                     image normalization
+    extractor      : str, the chapter extractor of this build (default: 'soup')
+    """
+
+    def __init__(self, output_dir, pandoc_args, load=True, image_settings=None, extractor="soup"):
+        self.output_dir = output_dir
+        self.filepath = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.pandoc_args = list(pandoc_args)
+        self.extractor = extractor
+        self.image_settings = image_settings
+        self.chapters = {}
+        self.rebuild_all = False
+        if load:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            print(f"No build manifest found at '{self.filepath}'. Converting every chapter.")
+            return
+        except (ValueError, OSError) as e:
+            print(f"Could not read build manifest '{self.filepath}' ({e}). Converting every chapter.")
+            return
+        self.chapters = data.get("chapters", {})
+        if data.get("pandoc_args") != self.pandoc_args:
+            print("The pandoc arguments changed since the last build. Converting every chapter.")
+            self.rebuild_all = True
+        elif data.get("extractor", "soup") != self.extractor:
+            print("The chapter extractor changed since the last build. Converting every chapter.")
+            self.rebuild_all = True
+        elif data.get("image_settings") != self.image_settings:
+            print("The image normalization settings changed since the last build. Converting every chapter.")
+            self.rebuild_all = True
+        print(f"Loaded build manifest with {len(self.chapters)} chapter(s).")
+
+    def chapter_is_current(self, source, html_file_path):
+        """True if the chapter source is unchanged since it was converted and its .tex file is still there."""
+        entry = self.chapters.get(source)
+        if entry is None or self.rebuild_all:
+            return False
+        if not os.path.exists(os.path.join(self.output_dir, entry["tex_filename"])):
+            return False
+        try:
+            stat = os.stat(html_file_path)
+        except OSError:
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        if file_sha256(html_file_path) != entry["sha256"]:
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns  # Touched but unchanged
+        return True
+
+    def chapter(self, source):
+        """The recorded entry of a chapter, with its 'tex_filename' and 'images'."""
+        return self.chapters[source]
+
+    def chapter_images(self, source):
+        """The images of a chapter: filename in the build -> attachment filename."""
+        images = self.chapters[source]["images"]
+        # Manifests of builds before image normalization list the filenames
+        return images if isinstance(images, dict) else {image: image for image in images}
+
+    def record_chapter(self, source, html_file_path, tex_filename, images):
+        """Records a converted chapter and the images (filename -> source path) it needs."""
+        stat = os.stat(html_file_path)
+        self.chapters[source] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": file_sha256(html_file_path),
+            "tex_filename": tex_filename,
+            "images": {image: os.path.basename(path) for image, path in sorted(images.items())},
+        }
+
+    def remove_stale(self, sources):
+        """
+        Drops the chapters that are no longer linked from the index and
+        deletes their .tex files, along with the images that no remaining
+        chapter needs.
+
+        Returns:
+            list: The deleted filenames.
+        """
+        sources = set(sources)
+        stale = [self.chapters.pop(source) for source in list(self.chapters) if source not in sources]
+        used = {entry["tex_filename"] for entry in self.chapters.values()}
+        used.update(image for entry in self.chapters.values() for image in entry["images"])
+
+        deleted = []
+        for entry in stale:
+            for filename in [entry["tex_filename"], *entry["images"]]:
+                filepath = os.path.join(self.output_dir, filename)
+                if filename not in used and filename not in deleted and os.path.exists(filepath):
+                    os.remove(filepath)
+                    deleted.append(filename)
+        return deleted
+
+    def save(self):
+        data = {"pandoc_args": self.pandoc_args, "extractor": self.extractor, "image_settings": self.image_settings,
+                "chapters": self.chapters}
+        tmp_path = self.filepath + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.filepath)
+        print(f"Saved build manifest to '{self.filepath}'.")
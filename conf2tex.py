@@ -1,10 +1,19 @@
 import os
 import sys
+import argparse
+import time
 import pypandoc
 from bs4 import BeautifulSoup
+import lxml.html
 import re
 import shutil
 import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pandoc_converter import PandocConverter, convert_html, process_pool_context
+from chapter_manifest import ChapterManifest
+from image_placer import ImagePlacer, STRATEGY_METHODS
+from image_normalizer import ImageNormalizer, ImageSettings, DEFAULT_CACHE_DIR
 
 # O.R.G.A.N.O.N.I.Z.E.R.
 #Obligatory Recursive Generator & Allocator of Navigable Output for Nearly Impossible Zero-Error Rendering
@@ -58,17 +67,60 @@ def get_chapter_links(index_file):
         print(f"❌ Error: '{index_file}' not found.")
         return None
 
-def convert_html_to_latex(html_file_path, output_dir, input_dir, copied_images):
+# Pandoc arguments for chapter conversion
+PANDOC_ARGS = ['--wrap=none', '--toc-depth=3']
+
+def resolve_chapter_image(src, input_dir, chapter_images, image_settings=None):
     """
-    Converts a single HTML file to LaTeX, finds and copies its images,
-    and updates image paths for LaTeX.
+    Resolves an <img> src pointing into the export's attachments folder and
+    records the image in chapter_images (filename -> source path), to be
+    placed by the ImagePlacer. With image_settings the filename is the one
+    the image has once normalized.
+
+    Returns:
+        str: The image filename to use as the new src, or None if the src
+             is not an attachment or the attachment is missing.
+    """
+    if not src or 'attachments' not in src:
+        return None
+
+    # URL Decode the src in case of spaces etc. (%20)
+    src_decoded = urllib.parse.unquote(src)
+    image_filename = os.path.basename(src_decoded)
+
+    # The source image path is inside the global attachments folder
+    source_image_path = os.path.join(input_dir, 'attachments', image_filename)
+
+    if not os.path.exists(source_image_path):
+        print(f"     ⚠️ Warning: Image attachment not found at '{source_image_path}'. Skipping it.")
+        return None
+
+    if image_settings is not None:
+        image_filename = image_settings.target_filename(image_filename)
+    chapter_images[image_filename] = source_image_path
+    return image_filename
+
+def chapter_tex_filename(html_filename):
+    base_name = os.path.splitext(html_filename)[0]
+    safe_base_name = re.sub(r'[^a-zA-Z0-9_-]', '', base_name)
+    return f"{safe_base_name}.tex"
+
+def extract_chapter(html_file_path, input_dir, image_settings=None):
+    """
+    Parses a single HTML chapter, finds its images, and updates image paths
+    for LaTeX (to the normalized filenames with image_settings). The images
+    are only listed; the caller places them.
+
+    Returns:
+        dict: The chapter 'title', the 'html' of the main content to hand
+              to pandoc, the target 'tex_filename' and the 'images' it
+              needs (filename -> source path), or None on error.
     """
     html_filename = os.path.basename(html_file_path)
     print(f"   - Converting '{html_filename}'...")
     try:
         with open(html_file_path, 'r', encoding='utf-8') as f:
             soup = BeautifulSoup(f, 'lxml')
-
         # --- Extract Chapter Title ---
         title_tag = soup.find('h1')
         chapter_title = title_tag.get_text(strip=True) if title_tag else soup.title.string
@@ -80,51 +132,71 @@ def convert_html_to_latex(html_file_path, output_dir, input_dir, copied_images):
             print(f"     ⚠️ Warning: Content container with id='main-content' not found in '{html_filename}'. Using entire <body>.")
             content_div = soup.body
         
-        # --- NEW: Find, Copy, and Update Image Paths ---
-        images = content_div.find_all('img')
-        for img in images:
-            src = img.get('src')
-            if not src or 'attachments' not in src:
-                continue
-
-            # URL Decode the src in case of spaces etc. (%20)
-            src_decoded = urllib.parse.unquote(src)
-            image_filename = os.path.basename(src_decoded)
-            
-            # The source image path is inside the global attachments folder
-            source_image_path = os.path.join(input_dir, 'attachments', image_filename)
-            dest_image_path = os.path.join(output_dir, image_filename)
-
-            if os.path.exists(source_image_path):
-                if image_filename not in copied_images:
-                    shutil.copy2(source_image_path, dest_image_path)
-                    copied_images.add(image_filename)
-                    print(f"       -> Copied attachment: '{image_filename}'")
-                
+        # --- NEW: Find and Update Image Paths ---
+        chapter_images = {}
+        for img in content_div.find_all('img'):
+            image_filename = resolve_chapter_image(img.get('src'), input_dir, chapter_images, image_settings)
+            if image_filename:
                 # Update the src in the HTML to be just the filename, so Pandoc
                 # creates a clean \includegraphics{filename.png} command.
                 img['src'] = image_filename
-            else:
-                print(f"     ⚠️ Warning: Image attachment not found at '{source_image_path}'. Skipping copy.")
 
-        # --- Convert to LaTeX using Pandoc ---
-        html_content = str(content_div)
-        extra_args = ['--wrap=none', '--toc-depth=3']
-        latex_content = pypandoc.convert_text(html_content, 'latex', format='html', extra_args=extra_args)
+        return {
+            "source": html_filename,
+            "title": chapter_title,
+            "html": str(content_div),
+            "tex_filename": chapter_tex_filename(html_filename),
+            "images": chapter_images,
+        }
+
+    except FileNotFoundError:
+        print(f"     ❌ Error: Chapter file '{html_filename}' not found. Skipping.")
+        return None
+    except Exception as e:
+        print(f"     ❌ An error occurred while converting '{html_filename}': {e}")
+        return None
+
+def extract_chapter_lxml(html_file_path, input_dir, image_settings=None):
+    """
+    Same as extract_chapter, but works on the lxml tree directly instead of
+    wrapping it in BeautifulSoup, which is several times faster on large
+    pages (e.g. tables with thousands of rows).
 
-        # --- Write the .tex file ---
-        base_name = os.path.splitext(html_filename)[0]
-        safe_base_name = re.sub(r'[^a-zA-Z0-9_-]', '', base_name)
-        tex_filename = f"{safe_base_name}.tex"
-        tex_filepath = os.path.join(output_dir, tex_filename)
+    Returns:
+        dict: See extract_chapter, or None on error.
+    """
+    html_filename = os.path.basename(html_file_path)
+    print(f"   - Converting '{html_filename}'...")
+    try:
+        with open(html_file_path, 'rb') as f:
+            root = lxml.html.document_fromstring(f.read(), parser=lxml.html.HTMLParser(encoding='utf-8'))
+        # --- Extract Chapter Title ---
+        title_tag = root.find('.//h1')
+        if title_tag is not None:
+            chapter_title = "".join(text.strip() for text in title_tag.itertext())
+        else:
+            chapter_title = root.findtext('.//title')
+        chapter_title = re.sub(r'[&%$#_{}]', r'\\\g<0>', chapter_title)
 
-        with open(tex_filepath, 'w', encoding='utf-8') as f:
-            f.write(f"% Converted from {html_filename}\n")
-            f.write(f"\\chapter{{{chapter_title}}}\n\n")
-            f.write(latex_content)
-        
-        print(f"     ✅ Successfully created '{tex_filepath}'")
-        return tex_filename
+        # --- Extract Main Content ---
+        content_div = next(iter(root.xpath('//*[@id="main-content"]')), None)
+        if content_div is None:
+            print(f"     ⚠️ Warning: Content container with id='main-content' not found in '{html_filename}'. Using entire <body>.")
+            content_div = root.body
+
+        chapter_images = {}
+        for img in content_div.iter('img'):
+            image_filename = resolve_chapter_image(img.get('src'), input_dir, chapter_images, image_settings)
+            if image_filename:
+                img.set('src', image_filename)
+
+        return {
+            "source": html_filename,
+            "title": chapter_title,
+            "html": lxml.html.tostring(content_div, encoding='unicode', with_tail=False),
+            "tex_filename": chapter_tex_filename(html_filename),
+            "images": chapter_images,
+        }
 
     except FileNotFoundError:
         print(f"     ❌ Error: Chapter file '{html_filename}' not found. Skipping.")
@@ -133,6 +205,142 @@ def convert_html_to_latex(html_file_path, output_dir, input_dir, copied_images):
         print(f"     ❌ An error occurred while converting '{html_filename}': {e}")
         return None
 
+# Chapter extraction backends, selected with --extractor
+CHAPTER_EXTRACTORS = {
+    "soup": extract_chapter,
+    "lxml": extract_chapter_lxml,
+}
+
+def write_chapter_tex(chapter, latex_content, output_dir):
+    """
+    Writes the converted LaTeX of a chapter, headed by its \\chapter command.
+
+    Returns:
+        str: The .tex filename, or None on error.
+    """
+    tex_filepath = os.path.join(output_dir, chapter["tex_filename"])
+    try:
+        with open(tex_filepath, 'w', encoding='utf-8') as f:
+            f.write(f"% Converted from {chapter['source']}\n")
+            f.write(f"\\chapter{{{chapter['title']}}}\n\n")
+            f.write(latex_content)
+    except Exception as e:
+        print(f"     ❌ An error occurred while writing '{tex_filepath}': {e}")
+        return None
+
+    print(f"     ✅ Successfully created '{tex_filepath}'")
+    return chapter["tex_filename"]
+
+def convert_chapters(chapter_html_files, output_dir, input_dir, placer, pandoc_workers=None, pandoc_batch=1,
+                     extractor="soup", image_settings=None):
+    """
+    Extracts the chapters one after the other in this process (with the
+    CHAPTER_EXTRACTORS backend named by extractor) and converts them through
+    the pandoc process pool. Their images are handed to the ImagePlacer,
+    which places them in the background meanwhile.
+
+    Returns:
+        list: The 'source', 'tex_filename' (None on error) and 'images' of
+              every chapter, in link order.
+    """
+    results = []
+    chapters = []
+    for html_file in chapter_html_files:
+        full_html_path = os.path.join(input_dir, html_file)
+        chapter = CHAPTER_EXTRACTORS[extractor](full_html_path, input_dir, image_settings)
+        results.append({"source": html_file, "tex_filename": None, "images": {}, "timings": {}})
+        if chapter:
+            placer.place(chapter["images"])
+            results[-1]["images"] = chapter["images"]
+            chapters.append((results[-1], chapter))
+
+    # All chapters go through pandoc together so the conversions can be
+    # batched and spread over the pandoc process pool.
+    with PandocConverter(PANDOC_ARGS, workers=pandoc_workers, batch_size=pandoc_batch) as converter:
+        latex_contents = converter.convert_many([chapter["html"] for _, chapter in chapters])
+
+    for (result, chapter), latex_content in zip(chapters, latex_contents):
+        if latex_content is None:
+            print(f"     ❌ Pandoc could not convert '{chapter['source']}'. Skipping.")
+            continue
+        result["tex_filename"] = write_chapter_tex(chapter, latex_content, output_dir)
+    return results
+
+def convert_chapter(html_file_path, output_dir, input_dir, extractor="soup", image_settings=None):
+    """
+    Extracts, converts and writes one chapter; the job of the --jobs worker
+    processes. The chapter's images are left for the parent process to
+    place, so no state is shared between the workers.
+
+    Returns:
+        dict: The chapter 'source', its 'tex_filename' (None on error), the
+              'images' it needs (filename -> source path) and the 'timings'
+              of each step in seconds.
+    """
+    timings = {}
+    start = time.perf_counter()
+    chapter = CHAPTER_EXTRACTORS[extractor](html_file_path, input_dir, image_settings)
+    timings["parse"] = time.perf_counter() - start
+    result = {"source": os.path.basename(html_file_path), "tex_filename": None, "images": {}, "timings": timings}
+    if chapter is None:
+        return result
+    result["images"] = chapter["images"]
+
+    start = time.perf_counter()
+    try:
+        latex_content = convert_html(chapter["html"], PANDOC_ARGS)
+    except Exception as e:
+        print(f"     ❌ An error occurred while converting '{chapter['source']}': {e}")
+        return result
+    finally:
+        timings["pandoc"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result["tex_filename"] = write_chapter_tex(chapter, latex_content, output_dir)
+    timings["write"] = time.perf_counter() - start
+    return result
+
+def convert_chapters_parallel(chapter_html_files, output_dir, input_dir, placer, jobs, extractor="soup",
+                              image_settings=None):
+    """
+    Converts the chapters in a pool of worker processes, each running parse,
+    pandoc and write for one chapter at a time, while the ImagePlacer places
+    the images the finished chapters need.
+
+    Returns:
+        list: The result of convert_chapter for every chapter, in link order.
+    """
+    # Not forked: the ImagePlacer threads are already running
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=process_pool_context()) as pool:
+        futures = {pool.submit(convert_chapter, os.path.join(input_dir, html_file), output_dir, input_dir,
+                               extractor, image_settings): index
+                   for index, html_file in enumerate(chapter_html_files)}
+        results = [None] * len(chapter_html_files)
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                print(f"     ❌ Worker failed on '{chapter_html_files[index]}': {e}")
+                result = {"source": chapter_html_files[index], "tex_filename": None, "images": {}, "timings": {}}
+            result["source"] = chapter_html_files[index]
+            placer.place(result["images"])
+            results[index] = result
+    return results
+
+def print_chapter_timings(results, limit=10):
+    """Prints the slowest chapters with the time spent in each step."""
+    timed = sorted((result for result in results if result["timings"]),
+                   key=lambda result: sum(result["timings"].values()), reverse=True)
+    if not timed:
+        return
+    print("\n🐢 Slowest chapters:")
+    for result in timed[:limit]:
+        timings = result["timings"]
+        steps = ", ".join(f"{step} {seconds:.2f} s" for step, seconds in timings.items())
+        print(f"   {sum(timings.values()):7.2f} s  {result['source']} ({steps})")
+
 def create_main_latex_file(chapter_tex_files, output_dir):
     """
     Generates the main .tex file that includes all the converted chapter files.
@@ -193,17 +401,49 @@ def create_main_latex_file(chapter_tex_files, output_dir):
         f.write(content)
     print(f"👍 Main file 'main.tex' created successfully.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Convert a Confluence HTML space export to a LaTeX project.",
+        epilog="Example: python conf2tex.py SAF")
+    parser.add_argument("input_dir", help="Path to the Confluence HTML export directory")
+    parser.add_argument("--pandoc-workers", type=int, default=None,
+                        help="Number of pandoc processes (default: number of cores)")
+    parser.add_argument("--pandoc-batch", type=int, default=1,
+                        help="Chapters converted per pandoc invocation (default: 1)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Convert chapters in this many worker processes, each parsing, converting and "
+                             "writing whole chapters (default: 1, parse here and only run pandoc in a pool)")
+    parser.add_argument("--extractor", choices=sorted(CHAPTER_EXTRACTORS), default="soup",
+                        help="HTML extraction backend: BeautifulSoup, or lxml directly, which is faster "
+                             "on large pages (default: soup)")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="Keep the previous output and only reconvert the chapters whose HTML changed")
+    parser.add_argument("--images", choices=list(STRATEGY_METHODS), default="auto",
+                        help="How images are placed in the output: hardlink, reflink (copy-on-write), symlink "
+                             "or copy, each falling back to a copy (default: auto, the cheapest available)")
+    parser.add_argument("--image-workers", type=int, default=4,
+                        help="Threads placing images in the background (default: 4)")
+    parser.add_argument("--normalize-images", action="store_true",
+                        help="Convert images pdflatex cannot include and downsample oversized ones (see image_normalizer.py)")
+    parser.add_argument("--image-dpi", type=int, default=200,
+                        help="Resolution of full-width images with --normalize-images (default: 200)")
+    parser.add_argument("--image-width", type=float, default=6.3,
+                        help="Printed width of full-width images in inches with --normalize-images (default: 6.3)")
+    parser.add_argument("--image-cache", default=DEFAULT_CACHE_DIR,
+                        help=f"Cache of normalized images, can be shared with confTraverse.py (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--timings", type=int, default=10, metavar="N",
+                        help="Number of slowest chapters to report with --jobs (default: 10)")
+    return parser.parse_args()
+
 def main():
     """Main function to orchestrate the conversion process."""
     print("--- Confluence HTML to LaTeX Converter ---")
     
-    # --- NEW: Get input directory from command line argument ---
-    if len(sys.argv) < 2:
-        print("❌ Usage: python convert_to_latex.py <path_to_confluence_export_directory>")
-        print("   Example: python convert_to_latex.py SAF")
-        sys.exit(1)
-        
-    input_dir = sys.argv[1]
+    # --- Get input directory and options from the command line ---
+    args = parse_args()
+    input_dir = args.input_dir
+    pandoc_workers = args.pandoc_workers
+    pandoc_batch = args.pandoc_batch
     if not os.path.isdir(input_dir):
         print(f"❌ Error: Input directory '{input_dir}' not found.")
         sys.exit(1)
@@ -218,21 +458,62 @@ def main():
     if chapter_html_files is None:
         return
 
-    if os.path.exists(output_dir):
+    if os.path.exists(output_dir) and not args.incremental:
         print(f"'{output_dir}' already exists. Clearing it before proceeding.")
         shutil.rmtree(output_dir)
-    os.makedirs(output_dir)
-    print(f"📂 Created output directory: '{output_dir}'")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"📂 Created output directory: '{output_dir}'")
+    image_settings, normalizer = None, None
+    if args.normalize_images:
+        image_settings = ImageSettings(dpi=args.image_dpi, width_in=args.image_width)
+        normalizer = ImageNormalizer(image_settings, args.image_cache)
+    manifest = ChapterManifest(output_dir, PANDOC_ARGS, load=args.incremental,
+                               image_settings=image_settings.key() if image_settings else None,
+                               extractor=args.extractor)
+
+    pending = [html_file for html_file in chapter_html_files
+               if not manifest.chapter_is_current(html_file, os.path.join(input_dir, html_file))]
+    current = [html_file for html_file in chapter_html_files if html_file not in pending]
+    if current:
+        print(f"♻️ {len(current)} chapter(s) unchanged since the last build.")
 
     print("\n🚀 Starting conversion of chapter files...")
+    start_time = time.perf_counter()
+    with ImagePlacer(output_dir, args.images, args.image_workers, normalizer) as placer:
+        # Unchanged chapters keep their .tex file; their images are only
+        # placed again if they went missing or changed in the export.
+        for html_file in current:
+            images = {image_filename: os.path.join(input_dir, 'attachments', source_filename)
+                      for image_filename, source_filename in manifest.chapter_images(html_file).items()}
+            placer.place({name: path for name, path in images.items() if os.path.exists(path)})
+
+        if args.jobs > 1:
+            results = convert_chapters_parallel(pending, output_dir, input_dir, placer, args.jobs, args.extractor,
+                                                image_settings)
+        else:
+            results = convert_chapters(pending, output_dir, input_dir, placer, pandoc_workers, pandoc_batch,
+                                       args.extractor, image_settings)
+    converted = {result["source"]: result for result in results if result["tex_filename"]}
+    print(f"⏱️ Converted {len(converted)} chapter(s) in {time.perf_counter() - start_time:.1f} s"
+          + (f" with {args.jobs} worker(s)." if args.jobs > 1 else "."))
+    if args.jobs > 1:
+        print_chapter_timings(results, args.timings)
+
     converted_tex_files = []
-    copied_images = set() # To avoid copying the same image multiple times
     for html_file in chapter_html_files:
-        full_html_path = os.path.join(input_dir, html_file)
-        tex_file = convert_html_to_latex(full_html_path, output_dir, input_dir, copied_images)
-        if tex_file:
-            converted_tex_files.append(tex_file)
-    
+        if html_file in converted:
+            result = converted[html_file]
+            manifest.record_chapter(html_file, os.path.join(input_dir, html_file),
+                                    result["tex_filename"], result["images"])
+            converted_tex_files.append(result["tex_filename"])
+        elif html_file in current:
+            converted_tex_files.append(manifest.chapter(html_file)["tex_filename"])
+
+    for filename in manifest.remove_stale(chapter_html_files):
+        print(f"🗑️ Removed '{filename}' of a chapter no longer in the index.")
+    manifest.save()
+
     if not converted_tex_files:
         print("\nNo files were converted. Exiting.")
         return
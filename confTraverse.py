@@ -16,17 +16,39 @@
 
 import os
 import re
-import requests
-from getpass import getpass
+import html
+import time
+import argparse
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from atlassian import Confluence
 from urllib.parse import unquote, urljoin
 
 from LatexWriter import LatexWriter
 
-import pypandoc
-
+from pandoc_converter import PandocConverter, convert_html
+from export_manifest import ExportManifest
+from attachment_downloader import AttachmentDownloader
+from attachment_store import AttachmentStore
+from image_placer import ImagePlacer
+from image_normalizer import ImageNormalizer, ImageSettings, IMAGE_FORMATS, DEFAULT_CACHE_DIR, rewrite_graphics
+from confluence_paging import DEFAULT_PAGE_SIZE, iter_attachments, iter_child_pages, iter_descendant_pages, iter_cql_content
 from confluence_auth import read_config, get_confluence_client
 
+# Pandoc arguments for page conversion (--wrap=none prevents long lines from wrapping)
+PANDOC_ARGS = ['--wrap=none']
+
+# Entries requested per call when listing children and attachments (--page-size)
+LIST_PAGE_SIZE = DEFAULT_PAGE_SIZE
+
+# Pages requested per call by the bulk descendant fetch (--bulk)
+BULK_PAGE_SIZE = 200
+
+# Image normalization settings (--normalize-images); the LaTeX of the pages
+# then includes the normalized images from NORMALIZED_IMAGE_DIR
+IMAGE_SETTINGS = None
+NORMALIZED_IMAGE_DIR = "images"
+
 
 def parse_confluence_url(url):
     """
@@ -49,7 +71,7 @@ def parse_confluence_url(url):
         print(f"An error occurred while parsing the URL: {e}")
         return None, None
 
-def convert_confluence_images(html_content):
+def convert_confluence_images(html_content, page_id=None):
     """
     Converts Confluence-style image tags to standard HTML <img> tags using regex.
 
@@ -58,8 +80,12 @@ def convert_confluence_images(html_content):
     and replaces them with:
     <img src="..." alt="..." title="...">
 
+    With a page_id the src is the path of the downloaded attachment in the
+    export, attachments/<page_id>/<filename> (see attachment_path).
+
     Args:
         html_content (str): A string containing the HTML content to process.
+        page_id (str): The page the attachments belong to.
 
     Returns:
         str: The processed HTML content with standard <img> tags.
@@ -78,11 +104,15 @@ def convert_confluence_images(html_content):
         re.DOTALL  # Allows '.' to match newlines, in case the tag is split across lines
     )
 
-    # The replacement string uses backreferences to the captured groups.
-    # \g<3> is the filename (src)
-    # \g<2> is the alt text (alt)
-    # \g<1> is the title (title)
-    replacement_html = r'<img src="\g<3>" alt="\g<2>" title="\g<1>">'
+    # The replacement uses the captured groups:
+    # group 3 is the filename (src)
+    # group 2 is the alt text (alt)
+    # group 1 is the title (title)
+    def replacement_html(match):
+        src = match.group(3)
+        if page_id is not None:
+            src = html.escape(attachment_path(page_id, html.unescape(src)).replace(os.sep, "/"))
+        return f'<img src="{src}" alt="{match.group(2)}" title="{match.group(1)}">'
 
     # Use re.sub() to find all matches and replace them.
     converted_content = pattern.sub(replacement_html, html_content)
@@ -93,127 +123,222 @@ def sanitize_filename(filename):
     """Removes characters that are invalid for filenames."""
     return re.sub(r'[<>:"/\\|?*]', '_', filename)
 
-def save_page_content(page, output_dir):
+def attachment_path(page_id, title):
+    """
+    Path of a page attachment relative to the export directory. Every page
+    has its own folder, so same-named attachments of different pages never
+    overwrite each other.
+    """
+    return os.path.join("attachments", str(page_id), sanitize_filename(title))
+
+def page_html(page):
+    """Returns the storage-format HTML of a page with Confluence images turned into <img> tags."""
+    # The HTML content is in the 'storage' format
+    return convert_confluence_images(page['body']['storage']['value'], page['id'])
+
+def write_page_latex(page_title, latex_content, output_dir):
+    """Writes the converted LaTeX of a page to '<title>.tex' and returns the filename."""
+    # Sanitize the title to create a valid filename
+    filename = sanitize_filename(page_title) + ".tex"
+    filepath = os.path.join(output_dir, filename)
+
+    latex_content = latex_content.replace("keepaspectratio", r"width=0.9\textwidth")
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(latex_content)
+    print(f"    - Saved LaTex to {filepath}")
+
+    return( filename )
+
+def save_page_content(page, output_dir, converter=None):
     """Saves the HTML content of a page to a file."""
     try:
-        page_title = page['title']
-        # Sanitize the title to create a valid filename
-        filename = sanitize_filename(page_title) + ".tex"
-        filepath = os.path.join(output_dir, filename)
-        
-        # The HTML content is in the 'storage' format
-        html_content1 = page['body']['storage']['value']
-
-        html_content = convert_confluence_images(html_content1)
+        html_content = page_html(page)
 
         try:
-            # Use pypandoc to convert the HTML string to LaTeX.
-            # The 'string' format for the input and 'latex' for the output
-            # ensures we get a plain LaTeX string, not a full document.
+            # Use pandoc to convert the HTML string to LaTeX.
             # This will also handle things like HTML tables, lists, and headings.
-            latex_content = pypandoc.convert_text(
-                html_content,
-                'latex',
-                format='html',
-                extra_args=['--wrap=none']  # Prevents long lines from wrapping
-            )
+            # With a PandocConverter the conversion runs in its process pool.
+            if converter is not None:
+                latex_content = converter.convert(html_content)
+            else:
+                latex_content = convert_html(html_content, PANDOC_ARGS)
         except Exception as e:
             # Handle potential errors, such as pandoc not being installed or found.
             print(f"An error occurred during conversion: {e}" )
             return
-        
-        latex_content = latex_content.replace("keepaspectratio", r"width=0.9\textwidth")
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(latex_content)
-        print(f"    - Saved LaTex to {filepath}")
 
-        return( filename )
+        return write_page_latex(page['title'], latex_content, output_dir)
 
     except Exception as e:
         print(f"    - Error saving HTML content for page '{page.get('title', 'N/A')}': {e}")
 
-def save_page_attachments(confluence, page_id, output_dir, auth_cfg):
-    """Downloads and saves all attachments for a given page."""
+def save_page_attachments(confluence, page_id, output_dir, downloader, manifest=None, store=None, attachments=None):
+    """
+    Queues all attachments of a given page on the shared downloader, so
+    attachments of many pages are downloaded in parallel, each page into its
+    own attachments/<page_id> folder. With a manifest, attachments whose
+    version and contents match the previous export are skipped.
+    With an attachment store, versions already in the store are linked
+    instead of downloaded, and new downloads are moved into the store.
+
+    'attachments' is the already known attachment listing of the page
+    (expanded with 'version'); by default it is requested page by page.
+    """
     try:
-        # Create a dedicated directory for attachments if it doesn't exist
-        attachments_dir = os.path.join(output_dir, "attachments")
-        os.makedirs(attachments_dir, exist_ok=True)
-        
-        attachments = confluence.get_attachments_from_content(page_id, start=0, limit=200)
-        
-        if not attachments['results']:
-            return # No attachments to download
-
-        print(f"    - Found {len(attachments['results'])} attachment(s). Downloading...")
-        for attachment in attachments['results']:
+        # Attachments are listed page by page, so downloads start before the listing is complete
+        if attachments is None:
+            attachments = iter_attachments(confluence, page_id, LIST_PAGE_SIZE, expand="version")
+        attachment_count = 0
+        for attachment in attachments:
+            attachment_count += 1
             attachment_title = attachment['title']
+            attachment_version = attachment.get('version', {}).get('number')
+            attachment_size = attachment.get('extensions', {}).get('fileSize')
+            filepath = os.path.join(output_dir, attachment_path(page_id, attachment_title))
+            if manifest is not None and manifest.attachment_is_current(attachment['id'], attachment_version, attachment_size, filepath):
+                print(f"      - '{attachment_title}' is unchanged. Skipping download.")
+                continue
             download_url = urljoin(confluence.url, attachment['_links']['download'])
             
-            # Use the authenticated session from the confluence object to download
-            # print(download_url) 
-            
             # There probably some bug in the Confluence implemntation: SSL certificate doesn't get sent 
-            # Resorting to using requests directly
-            #response = confluence.session.get(download_url)
-            #response.raise_for_status() # Raise an exception for bad status codes
-            
-            
-            # Prepend page_id to filename to avoid name conflicts
-            # filename = f"{page_id}_{sanitize_filename(attachment_title)}"
-            filename = sanitize_filename(attachment_title)
-            filepath = os.path.join(attachments_dir, filename)
-            
-            token = auth_cfg['TOKEN']
-            cert_path = auth_cfg['CERTIFICATE']  # Assuming the certificate path is in the config
-
-            response = requests.get(
-                download_url,
-                headers={"Authorization": f"Bearer {token}"},
-                verify=cert_path,
-                stream=True
-            )
-
-            response.raise_for_status()
-            # print( response.status_code)
-        
-            with open(filepath, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            # with confluence.session, so the downloader keeps its own authenticated session.
+
+            # Create a dedicated directory for the page's attachments if it doesn't exist
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+            if store is not None and store.link_existing(attachment['id'], attachment_version, page_id, attachment_title, filepath):
+                print(f"      - '{attachment_title}' is already in the attachment store. Linked to {filepath}")
+                if manifest is not None:
+                    manifest.record_attachment(attachment['id'], attachment_version, filepath)
+                continue
+
+            on_complete = partial(attachment_downloaded, attachment['id'], attachment_version, page_id,
+                                  attachment_title, filepath, manifest, store)
+            download_path = filepath if store is None else store.staging_path(attachment['id'], attachment_version)
+            downloader.submit(download_url, download_path, attachment_title, on_complete)
 
-            print(f"      - Downloaded '{attachment_title}' to {filepath}")
+        if attachment_count:
+            print(f"    - Found {attachment_count} attachment(s) on page {page_id}.")
 
-    except requests.exceptions.HTTPError as e:
-        print(f"    - HTTP Error downloading attachments for page {page_id}: {e}")
     except Exception as e:
-        print(f"    - General Error downloading attachments for page {page_id}: {e}")
+        print(f"    - General Error listing attachments for page {page_id}: {e}")
 
-def process_page_and_children(confluence, page_id, level, output_dir, auth_cfg, latex_writer):
+def attachment_downloaded(attachment_id, version, page_id, title, filepath, manifest, store, download_path):
+    """Runs in a downloader thread once an attachment has been downloaded to download_path."""
+    sha256 = None
+    if store is not None:
+        sha256 = store.add(download_path, filepath, attachment_id, version, page_id, title)
+    if manifest is not None:
+        manifest.record_attachment(attachment_id, version, filepath, sha256)
+
+def normalize_attachment_images(export_dir, normalizer, workers=4):
+    """
+    Places the normalized versions of the downloaded image attachments in
+    <export>/images/<page_id>. The attachments themselves stay as
+    downloaded, so the manifest and the attachment store still recognise them.
+
+    Returns:
+        dict: Attachment path -> normalized image path, relative to the
+              export and with '/' separators, of the images that were placed.
+    """
+    attachments_dir = os.path.join(export_dir, "attachments")
+    if not os.path.isdir(attachments_dir):
+        return {}
+    images = {}
+    for page_dir in sorted(os.listdir(attachments_dir)):
+        page_path = os.path.join(attachments_dir, page_dir)
+        if not os.path.isdir(page_path):
+            continue
+        filenames = [filename for filename in sorted(os.listdir(page_path))
+                     if os.path.splitext(filename)[1].lower() in IMAGE_FORMATS]
+        for filename, target in normalizer.settings.target_filenames(filenames).items():
+            target = os.path.join(page_dir, target)
+            if target in images:
+                print(f"    - Warning: '{filename}' of page {page_dir} has the same normalized name as another "
+                      f"image ({target}). Leaving it unnormalized.")
+                continue
+            images[target] = os.path.join(page_path, filename)
+    images_dir = os.path.join(export_dir, NORMALIZED_IMAGE_DIR)
+    for page_dir in {os.path.dirname(target) for target in images}:
+        os.makedirs(os.path.join(images_dir, page_dir), exist_ok=True)
+    print(f"\n--- Normalizing {len(images)} image(s) into '{images_dir}' ---")
+    with ImagePlacer(images_dir, "auto", workers, normalizer) as placer:
+        placer.place(images)
+    return {os.path.relpath(images[target], export_dir).replace(os.sep, "/"):
+            f"{NORMALIZED_IMAGE_DIR}/{target.replace(os.sep, '/')}" for target in placer.placed}
+
+def rewrite_page_graphics(export_dir, page_filenames, placed):
+    """
+    Points the \\includegraphics commands of the page .tex files at the
+    normalized images that were placed (see normalize_attachment_images).
+    Images that were not placed keep their attachment paths.
+    """
+    rewritten = 0
+    for filename in page_filenames:
+        filepath = os.path.join(export_dir, filename)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                latex_content = f.read()
+        except OSError as e:
+            print(f"    - Could not read {filepath} to point it at the normalized images: {e}")
+            continue
+        new_content = rewrite_graphics(latex_content, placed)
+        if new_content != latex_content:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(new_content)
+            rewritten += 1
+    print(f"Pointed {rewritten} page(s) at the normalized images.")
+
+def get_level_label(level):
+    """Returns the LaTeX sectioning command name for a given tree depth."""
+    # Define the hierarchical labels
+    levels = ["Document", "chapter", "section", "subsection", "subsubsection"]
+    if level < len(levels):
+        return levels[level]
+    return f"{levels[-1]}-{level - len(levels) + 2}"
+
+def page_version(page):
+    """Returns the Confluence version number of a page fetched with expand='version'."""
+    return page.get('version', {}).get('number')
+
+def fetch_page(confluence, page_id, manifest=None):
+    """
+    Retrieves a page with its storage body. For a page already in the
+    manifest, only the page version is fetched first, and the body is not
+    downloaded at all if the previous export of that version is still on disk.
+
+    Returns:
+        tuple: (page, unchanged). 'page' is None if it could not be retrieved.
+    """
+    if manifest is not None and manifest.knows_page(page_id):
+        page = confluence.get_page_by_id(page_id, expand="version")
+        if page and manifest.page_is_current(page_id, page_version(page)):
+            return page, True
+    # Expand 'body.storage' to get the HTML content
+    return confluence.get_page_by_id(page_id, expand="body.storage,version"), False
+
+def process_page_and_children(confluence, page_id, level, output_dir, downloader, latex_writer, converter=None, manifest=None, store=None):
     """
     Processes a given page (prints info, saves content/attachments)
     and then recursively does the same for all its children.
+
+    Returns:
+        int: The number of pages processed in this subtree.
     """
     try:
-        # Expand 'body.storage' to get the HTML content
-        page = confluence.get_page_by_id(page_id, expand="body.storage")
+        page, unchanged = fetch_page(confluence, page_id, manifest)
         if not page:
             print(f"Could not retrieve details for page ID {page_id}. Skipping.")
-            return
+            return 0
     except Exception as e:
         print(f"Error getting page details for ID {page_id}: {e}. Skipping.")
-        return
+        return 0
 
     page_title = page['title']
     
-    # Define the hierarchical labels
-    levels = ["Document", "chapter", "section", "subsection", "subsubsection"]
     indent = "  " * level
-    
-    if level < len(levels):
-        level_label = levels[level]
-    else:
-        level_label = f"{levels[-1]}-{level - len(levels) + 2}"
+    level_label = get_level_label(level)
     
     # Print the formatted page information
     if level == 0:
@@ -222,35 +347,322 @@ def process_page_and_children(confluence, page_id, level, output_dir, auth_cfg,
         print(f"{indent}- {level_label}: {page_title}")
         latex_writer.write_text(f"\\{level_label}{{{page_title}}}")
 
-    # Save the page's HTML content
-    filename = save_page_content(page, output_dir)
+    # Save the page's HTML content, unless the previous export is still current
+    if unchanged:
+        filename = manifest.page_filename(page_id)
+        print(f"{indent}  (unchanged since last export, reusing {filename})")
+    else:
+        filename = save_page_content(page, output_dir, converter)
+        if manifest is not None and filename:
+            manifest.record_page(page_id, page_version(page), page_title, filename)
     latex_writer.write_text(f"\\input{{{filename}}}")
 
     # Download and save the page's attachments
-    save_page_attachments(confluence, page_id, output_dir, auth_cfg)
+    save_page_attachments(confluence, page_id, output_dir, downloader, manifest, store)
 
     # --- Recurse for child pages ---
+    page_count = 1
     try:
-        child_pages = confluence.get_child_pages(page_id)
+        child_pages = iter_child_pages(confluence, page_id, LIST_PAGE_SIZE)
         for child in child_pages:
-            process_page_and_children(confluence, child['id'], level + 1, output_dir, auth_cfg, latex_writer)
+            page_count += process_page_and_children(confluence, child['id'], level + 1, output_dir, downloader, latex_writer, converter, manifest, store)
     except Exception as e:
         print(f"{indent}Error retrieving child pages for '{page_title}': {e}")
 
-    
+    return page_count
+
+def fetch_page_node(confluence, page_id, level, output_dir, downloader, manifest=None, store=None):
+    """
+    Fetches a single page, saves its attachments, and lists its children.
+    Runs inside a worker thread, so it never touches the LatexWriter. The
+    page HTML is kept on the node and converted once the whole tree is known.
+
+    Returns:
+        dict: A tree node with the page id, level, title, HTML and the
+              ordered list of child page ids. 'title' is None if the page
+              could not be retrieved; 'html' is None if the page is unchanged
+              since the last export and 'filename' is already known.
+    """
+    node = {"id": page_id, "level": level, "title": None, "version": None, "html": None, "filename": None, "children": []}
+    try:
+        page, unchanged = fetch_page(confluence, page_id, manifest)
+        if not page:
+            print(f"Could not retrieve details for page ID {page_id}. Skipping.")
+            return node
+    except Exception as e:
+        print(f"Error getting page details for ID {page_id}: {e}. Skipping.")
+        return node
+
+    node["title"] = page['title']
+    node["version"] = page_version(page)
+    if unchanged:
+        node["filename"] = manifest.page_filename(page_id)
+    else:
+        try:
+            node["html"] = page_html(page)
+        except Exception as e:
+            print(f"    - Error reading HTML content for page '{node['title']}': {e}")
+    save_page_attachments(confluence, page_id, output_dir, downloader, manifest, store)
+
+    try:
+        node["children"] = [child['id'] for child in iter_child_pages(confluence, page_id, LIST_PAGE_SIZE)]
+    except Exception as e:
+        print(f"Error retrieving child pages for '{node['title']}': {e}")
+
+    return node
+
+def convert_page_nodes(nodes, output_dir, converter, manifest=None):
+    """
+    Converts the HTML of all fetched pages in one go, so the converter can
+    batch and parallelize pandoc, then writes the .tex files.
+    """
+    pending = [node for node in nodes.values() if node["html"] is not None]
+    latex_contents = converter.convert_many([node["html"] for node in pending])
+    for node, latex_content in zip(pending, latex_contents):
+        node["html"] = None
+        if latex_content is None:
+            continue
+        try:
+            node["filename"] = write_page_latex(node["title"], latex_content, output_dir)
+            if manifest is not None:
+                manifest.record_page(node["id"], node["version"], node["title"], node["filename"])
+        except Exception as e:
+            print(f"    - Error saving HTML content for page '{node['title']}': {e}")
+
+def emit_page_tree(nodes, page_id, latex_writer):
+    """
+    Writes the chapter/section and input lines for an already fetched
+    page tree, depth-first in the original child order.
+    """
+    node = nodes.get(page_id)
+    if node is None or node["title"] is None:
+        return
+
+    level = node["level"]
+    if level == 0:
+        print(f"Processing Root Page: {node['title']}")
+    else:
+        print(f"{'  ' * level}- {get_level_label(level)}: {node['title']}")
+        latex_writer.write_text(f"\\{get_level_label(level)}{{{node['title']}}}")
+
+    latex_writer.write_text(f"\\input{{{node['filename']}}}")
+
+    for child_id in node["children"]:
+        emit_page_tree(nodes, child_id, latex_writer)
+
+def process_page_tree_concurrently(confluence, page_id, output_dir, downloader, latex_writer, max_workers=8, converter=None, manifest=None, store=None):
+    """
+    Same result as process_page_and_children, but sibling subtrees are fetched
+    in parallel by a bounded pool of worker threads. The LaTeX structure is
+    written only once the whole tree is known, so main.tex keeps the
+    deterministic depth-first order.
+
+    Returns:
+        int: The number of pages fetched.
+    """
+    nodes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(fetch_page_node, confluence, page_id, 0, output_dir, downloader, manifest, store)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = future.result()
+                nodes[node["id"]] = node
+                for child_id in node["children"]:
+                    pending.add(pool.submit(fetch_page_node, confluence, child_id, node["level"] + 1, output_dir, downloader, manifest, store))
+
+    if converter is None:
+        with PandocConverter(PANDOC_ARGS, workers=1) as converter:
+            convert_page_nodes(nodes, output_dir, converter, manifest)
+    else:
+        convert_page_nodes(nodes, output_dir, converter, manifest)
+
+    emit_page_tree(nodes, page_id, latex_writer)
+    return sum(1 for node in nodes.values() if node["title"] is not None)
+
+def listed_attachments(page):
+    """
+    Returns the attachments embedded in a page fetched with
+    expand='children.attachment.version', or None if the embedded listing
+    is truncated and the attachments have to be listed separately.
+    """
+    listing = page.get('children', {}).get('attachment')
+    if listing is None or "next" in listing.get('_links', {}):
+        return None
+    return listing.get('results', [])
+
+def sibling_order(page):
+    """
+    Sort key for the children of a page: manually ordered pages carry their
+    position, otherwise Confluence lists siblings alphabetically.
+    """
+    position = page.get('extensions', {}).get('position')
+    if isinstance(position, int):
+        return (0, position, page['title'])
+    return (1, 0, page['title'])
+
+def fetch_page_tree_bulk(confluence, page_id, output_dir, downloader, manifest=None, store=None, page_size=BULK_PAGE_SIZE):
+    """
+    Retrieves a whole subtree with a handful of large descendant listings
+    instead of several requests per page, and rebuilds the hierarchy from
+    each page's ancestors.
+
+    Without previous export data, bodies come with the listing itself. For an
+    incremental export the listing carries only versions, and the bodies of
+    changed pages are then fetched together with 'id in (...)' CQL queries.
+
+    Returns:
+        dict: Tree nodes keyed by page id, as built by fetch_page_node.
+    """
+    two_phase = manifest is not None and bool(manifest.pages)
+    expand = "version,ancestors,children.attachment.version"
+    if not two_phase:
+        expand += ",body.storage"
+
+    root, unchanged = fetch_page(confluence, page_id, manifest)
+    if not root:
+        print(f"Could not retrieve details for page ID {page_id}. Skipping.")
+        return {}
+    pages = [root] + list(iter_descendant_pages(confluence, page_id, page_size, expand=expand))
+    print(f"Listed {len(pages)} page(s) below and including '{root['title']}'.")
+
+    nodes = {}
+    children = {}
+    for page in pages:
+        node = {"id": page['id'], "level": 0, "title": page['title'], "version": page_version(page),
+                "html": None, "filename": None, "children": []}
+        nodes[page['id']] = node
+        if page is not root:
+            parent_id = page['ancestors'][-1]['id']
+            children.setdefault(parent_id, []).append(page)
+
+    # Rebuild levels and sibling order top-down from the root
+    stack = [root['id']]
+    while stack:
+        node = nodes[stack.pop()]
+        siblings = sorted(children.get(node["id"], []), key=sibling_order)
+        node["children"] = [child['id'] for child in siblings]
+        for child_id in node["children"]:
+            nodes[child_id]["level"] = node["level"] + 1
+        stack.extend(node["children"])
+
+    # Work out which bodies are still needed
+    by_id = {page['id']: page for page in pages}
+    missing = []
+    for node_id, node in nodes.items():
+        page = by_id[node_id]
+        if page is root and unchanged:
+            node["filename"] = manifest.page_filename(node_id)
+        elif two_phase and manifest.page_is_current(node_id, node["version"]):
+            node["filename"] = manifest.page_filename(node_id)
+        elif 'body' in page:
+            node["html"] = page_html(page)
+        else:
+            missing.append(node_id)
+
+    # Keep the 'id in (...)' queries to a sensible URL length
+    chunk = min(page_size, 100)
+    for i in range(0, len(missing), chunk):
+        ids = ",".join(missing[i:i + chunk])
+        for page in iter_cql_content(confluence, f"id in ({ids})", page_size, expand="body.storage"):
+            nodes[page['id']]["html"] = page_html(page)
+    if two_phase:
+        print(f"{len(missing)} page(s) changed since the last export.")
+
+    for page in pages:
+        save_page_attachments(confluence, page['id'], output_dir, downloader, manifest, store, listed_attachments(page))
+
+    return nodes
+
+def process_page_tree_bulk(confluence, page_id, output_dir, downloader, latex_writer, converter=None, manifest=None, store=None, page_size=BULK_PAGE_SIZE):
+    """
+    Same result as process_page_and_children, using fetch_page_tree_bulk
+    to retrieve the tree.
+
+    Returns:
+        int: The number of pages fetched.
+    """
+    nodes = fetch_page_tree_bulk(confluence, page_id, output_dir, downloader, manifest, store, page_size)
+
+    if converter is None:
+        with PandocConverter(PANDOC_ARGS, workers=1) as converter:
+            convert_page_nodes(nodes, output_dir, converter, manifest)
+    else:
+        convert_page_nodes(nodes, output_dir, converter, manifest)
+
+    emit_page_tree(nodes, page_id, latex_writer)
+    return len(nodes)
+
+def traversal_mode(args):
+    """Describes the traversal the arguments select, for the summary."""
+    if args.bulk:
+        return "bulk"
+    if args.workers > 1:
+        return f"concurrent, {args.workers} workers"
+    return "sequential"
+
+def print_traversal_summary(page_count, elapsed, mode):
+    """Prints pages/sec and wall time so the traversal mode and worker count can be tuned against server rate limits."""
+    rate = page_count / elapsed if elapsed > 0 else 0.0
+    print(f"\n--- Traversal summary: {page_count} page(s) in {elapsed:.1f} s "
+          f"({rate:.2f} pages/s, {mode}) ---")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export a Confluence page tree to LaTeX.")
+    parser.add_argument("url", nargs="?",
+                        default="https://confluence.tii.ae/display/SAF/System+Engineering+Plan",
+                        help="URL of the root Confluence page (/display/SPACEKEY/Page+Title)")
+    parser.add_argument("-c", "--config", default="scribe.cfg",
+                        help="Configuration file (default: scribe.cfg)")
+    parser.add_argument("-o", "--output", default="confluence_export",
+                        help="Export directory (default: confluence_export)")
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="Number of pages fetched in parallel; 1 keeps the sequential traversal (default: 8)")
+    parser.add_argument("-b", "--bulk", action="store_true",
+                        help="Fetch the whole tree with a few descendant listings instead of per-page requests")
+    parser.add_argument("--bulk-page-size", type=int, default=BULK_PAGE_SIZE,
+                        help=f"Pages per descendant listing request in --bulk mode (default: {BULK_PAGE_SIZE})")
+    parser.add_argument("--pandoc-workers", type=int, default=None,
+                        help="Number of pandoc processes (default: number of cores)")
+    parser.add_argument("--pandoc-batch", type=int, default=1,
+                        help="Pages converted per pandoc invocation (default: 1)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"Entries per request when listing children and attachments (default: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--download-workers", type=int, default=8,
+                        help="Number of parallel attachment downloads / pooled connections (default: 8)")
+    parser.add_argument("--download-chunk-kb", type=int, default=1024,
+                        help="Read size while streaming attachments, in KiB (default: 1024)")
+    parser.add_argument("--attachment-store", default=None,
+                        help="Content-addressed attachment store, can be shared between exports "
+                             "(default: <output>/.attachment_store)")
+    parser.add_argument("--no-attachment-store", action="store_true",
+                        help="Write attachments directly into <output>/attachments without deduplication")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="Skip pages and attachments whose Confluence version is unchanged since the last export")
+    parser.add_argument("--normalize-images", action="store_true",
+                        help="Convert images pdflatex cannot include and downsample oversized ones into "
+                             f"<output>/{NORMALIZED_IMAGE_DIR} (see image_normalizer.py)")
+    parser.add_argument("--image-dpi", type=int, default=200,
+                        help="Resolution of full-width images with --normalize-images (default: 200)")
+    parser.add_argument("--image-width", type=float, default=6.3,
+                        help="Printed width of full-width images in inches with --normalize-images (default: 6.3)")
+    parser.add_argument("--image-cache", default=DEFAULT_CACHE_DIR,
+                        help=f"Cache of normalized images, can be shared with conf2tex.py (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--image-workers", type=int, default=4,
+                        help="Number of images normalized in parallel (default: 4)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    # Also alternatively take configuration file from the command line 
-    confluence_cfg, auth_cfg = read_config()
+    args = parse_args()
+    LIST_PAGE_SIZE = args.page_size
+    if args.normalize_images:
+        IMAGE_SETTINGS = ImageSettings(dpi=args.image_dpi, width_in=args.image_width)
+    confluence_cfg, auth_cfg = read_config(args.config)
 
-    # Should be actually taken from the command line arguments
     # Initialize Confluence client once
     confluence = get_confluence_client(confluence_cfg, auth_cfg)
-    # Create a root directory for the export
-    export_dir = "confluence_export"
 
-    start_page_url = "https://confluence.tii.ae/display/SAF/Project+Management+Plan"
-    start_page_url = "https://confluence.tii.ae/display/SAF/System+Engineering+Plan"
-    space_key, page_title = parse_confluence_url(start_page_url)
+    space_key, page_title = parse_confluence_url(args.url)
 
     print( space_key, ":",  page_title)
 
@@ -270,15 +682,37 @@ if __name__ == "__main__":
         print(f"Successfully found page ID: {start_page_id}")
         
         # Create a root directory for the export
-        export_dir = "confluence_export"
+        export_dir = args.output
         os.makedirs(export_dir, exist_ok=True)
         print(f"All content will be saved in the '{export_dir}' directory.")
         
         print("----Creating main LaTeX file...")
         # Initialize the LatexWriter
         latex_writer = LatexWriter(export_dir = export_dir)
+        # The manifest is always written, but only an incremental run trusts the previous one
+        manifest = ExportManifest(export_dir, load=args.incremental)
+        store = None
+        if not args.no_attachment_store:
+            store = AttachmentStore(args.attachment_store or os.path.join(export_dir, ".attachment_store"))
         print("\n--- Traversing Site and Exporting Content ---")
-        process_page_and_children(confluence, start_page_id, 0, export_dir, auth_cfg, latex_writer)
+        start_time = time.perf_counter()
+        downloader = AttachmentDownloader.from_auth_config(auth_cfg, workers=args.download_workers,
+                                                           chunk_size=args.download_chunk_kb * 1024)
+        with downloader, PandocConverter(PANDOC_ARGS, workers=args.pandoc_workers, batch_size=args.pandoc_batch) as converter:
+            if args.bulk:
+                page_count = process_page_tree_bulk(confluence, start_page_id, export_dir, downloader, latex_writer, converter, manifest, store, args.bulk_page_size)
+            elif args.workers > 1:
+                page_count = process_page_tree_concurrently(confluence, start_page_id, export_dir, downloader, latex_writer, args.workers, converter, manifest, store)
+            else:
+                page_count = process_page_and_children(confluence, start_page_id, 0, export_dir, downloader, latex_writer, converter, manifest, store)
+        elapsed = time.perf_counter() - start_time
+        manifest.save()
+        if store is not None:
+            store.save()
+        if IMAGE_SETTINGS is not None:
+            placed = normalize_attachment_images(export_dir, ImageNormalizer(IMAGE_SETTINGS, args.image_cache), args.image_workers)
+            rewrite_page_graphics(export_dir, manifest.page_filenames(), placed)
+        print_traversal_summary(page_count, elapsed, traversal_mode(args))
         print("\n--- Export Complete! ---")
 
         # Finalize the main LaTex Document 
@@ -0,0 +1,87 @@
+# confluence_paging.py
+
+# Paginated iterators over Confluence listing endpoints.
+#
+# The REST API returns listings (children, attachments, descendants, CQL
+# results) in pages of at most 'limit' entries. A single call therefore
+# silently truncates large listings. The iterators below stream every entry,
+# page by page, and fetch the next page in a background thread while the
+# caller is still processing the current one.
+
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def paginate(fetch, page_size=DEFAULT_PAGE_SIZE, prefetch=True):
+    """
+    Yields all results of a paginated listing.
+
+    Args:
+        fetch (callable): fetch(start, limit) returning the raw REST response,
+                          a dict with 'results' and, if there are more
+                          entries, '_links': {'next': ...}.
+        page_size (int): Number of entries requested per call. The server may
+                         return fewer; the next start follows what was returned.
+        prefetch (bool): Request the next page while the current one is consumed.
+
+    Yields:
+        dict: One listing entry at a time.
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        start = 0
+        response = fetch(start, page_size)
+        while True:
+            results = response.get("results", [])
+            start += len(results)
+            has_next = bool(results) and "next" in response.get("_links", {})
+
+            next_response = None
+            if has_next and executor is not None:
+                next_response = executor.submit(fetch, start, page_size)
+
+            yield from results
+
+            if not has_next:
+                return
+            response = next_response.result() if next_response is not None else fetch(start, page_size)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def _content_listing(confluence, path, page_size, expand, prefetch, extra_params=None):
+    def fetch(start, limit):
+        params = {"start": start, "limit": limit}
+        if expand:
+            params["expand"] = expand
+        params.update(extra_params or {})
+        return confluence.get(path, params=params)
+    return paginate(fetch, page_size, prefetch)
+
+
+def iter_child_pages(confluence, page_id, page_size=DEFAULT_PAGE_SIZE, expand=None, prefetch=True):
+    """Yields the direct child pages of a page, in their Confluence order."""
+    return _content_listing(confluence, f"rest/api/content/{page_id}/child/page", page_size, expand, prefetch)
+
+
+def iter_attachments(confluence, page_id, page_size=DEFAULT_PAGE_SIZE, expand=None, prefetch=True):
+    """Yields all attachments of a page."""
+    return _content_listing(confluence, f"rest/api/content/{page_id}/child/attachment", page_size, expand, prefetch)
+
+
+def iter_descendant_pages(confluence, page_id, page_size=DEFAULT_PAGE_SIZE, expand=None, prefetch=True):
+    """Yields all pages below a page, at any depth."""
+    return _content_listing(confluence, f"rest/api/content/{page_id}/descendant/page", page_size, expand, prefetch)
+
+
+def iter_space_pages(confluence, space_key, page_size=DEFAULT_PAGE_SIZE, expand=None, prefetch=True):
+    """Yields every page of a space."""
+    return _content_listing(confluence, "rest/api/content", page_size, expand, prefetch,
+                            {"spaceKey": space_key, "type": "page"})
+
+
+def iter_cql_content(confluence, cql, page_size=DEFAULT_PAGE_SIZE, expand=None, prefetch=True):
+    """Yields all content matching a CQL query, e.g. 'id in (123,456)'."""
+    return _content_listing(confluence, "rest/api/content/search", page_size, expand, prefetch, {"cql": cql})
@@ -0,0 +1,268 @@
+# confluence_storage.py
+
+# In-process Markdown -> Confluence storage format (XHTML) renderer for the
+# section text of scribe.py outlines.
+#
+# The outlines are ECSS requirement skeletons copied from PDFs: wrapped
+# paragraphs, "a." requirement lists with "1." lists below them (usually
+# without indentation), "-" bullets, the odd pipe table and fenced code.
+# Rendering them here instead of through pandoc avoids a process start per
+# section, and StorageRenderer memoizes the result by content hash, so
+# boilerplate repeated across sections and documents is rendered only once.
+#
+# Supported syntax:
+#   paragraphs         consecutive lines, joined; a blank line ends them
+#   lists              "-", "*", "+" bullets; "1." "1)" "(1)" numbered;
+#                      "a." "a)" "(a)" lettered. Deeper indentation, or a
+#                      different marker type at the same indentation, opens
+#                      a nested list; a marker type already open closes back
+#                      to that list.
+#   tables             "| a | b |" rows, with an optional "|---|---|" row
+#                      marking the row above it as the header
+#   fenced code        ``` blocks, rendered as a code macro
+#   inline             **strong**, *emphasis*, _emphasis_, `code`, [text](url)
+
+import re
+import html
+import hashlib
+import threading
+from collections import OrderedDict
+
+LIST_ITEM_PATTERN = re.compile(
+    r"^(?P<indent>[ \t]*)(?:(?P<bullet>[-*+])|(?P<number>\d+)[.)]|\((?P<pnumber>\d+)\)"
+    r"|(?P<letter>[a-z])[.)]|\((?P<pletter>[a-z])\))[ \t]+(?P<text>\S.*)$")
+TABLE_SEPARATOR_PATTERN = re.compile(r"^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)\s*([\w+-]*)")
+
+INLINE_CODE_PATTERN = re.compile(r"`([^`]+)`")
+LINK_PATTERN = re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)")
+STRONG_PATTERN = re.compile(r"\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__")
+EMPHASIS_PATTERN = re.compile(r"(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])|(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])")
+
+LIST_TAGS = {
+    "bullet": "<ul>",
+    "decimal": "<ol>",
+    "alpha": '<ol style="list-style-type: lower-alpha;">',
+}
+
+
+def render_inline(text):
+    """Escapes a line of text and renders its inline markup."""
+    parts = INLINE_CODE_PATTERN.split(text)
+    out = []
+    # split() alternates plain text and code span contents
+    for i, part in enumerate(parts):
+        part = html.escape(part)
+        if i % 2:
+            out.append(f"<code>{part}</code>")
+            continue
+        part = LINK_PATTERN.sub(r'<a href="\2">\1</a>', part)
+        part = STRONG_PATTERN.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", part)
+        part = EMPHASIS_PATTERN.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", part)
+        out.append(part)
+    return "".join(out)
+
+
+def _indent_width(indent):
+    return len(indent.expandtabs(4))
+
+
+def _table_cells(row):
+    row = row.strip()
+    if row.startswith("|"):
+        row = row[1:]
+    if row.endswith("|"):
+        row = row[:-1]
+    return [cell.strip() for cell in row.split("|")]
+
+
+def render_table(rows):
+    """Renders pipe table rows as a Confluence table."""
+    header = None
+    if len(rows) > 1 and TABLE_SEPARATOR_PATTERN.match(rows[1].strip()):
+        header, rows = rows[0], rows[2:]
+    out = ["<table><tbody>"]
+    if header is not None:
+        out.append("<tr>" + "".join(f"<th>{render_inline(cell)}</th>" for cell in _table_cells(header)) + "</tr>")
+    for row in rows:
+        out.append("<tr>" + "".join(f"<td>{render_inline(cell)}</td>" for cell in _table_cells(row)) + "</tr>")
+    out.append("</tbody></table>")
+    return "".join(out)
+
+
+def render_code(lines, language=""):
+    """Renders a fenced block as a Confluence code macro."""
+    body = "\n".join(lines).replace("]]>", "]]]]><![CDATA[>")
+    parameter = f'<ac:parameter ac:name="language">{html.escape(language)}</ac:parameter>' if language else ""
+    return (f'<ac:structured-macro ac:name="code">{parameter}'
+            f"<ac:plain-text-body><![CDATA[{body}]]></ac:plain-text-body></ac:structured-macro>")
+
+
+class _StorageWriter:
+    """Line-by-line state machine behind render_storage."""
+
+    def __init__(self):
+        self.out = []
+        self.paragraph = []  # Lines of the open paragraph or list item text
+        self.lists = []      # Open lists, outermost first: [kind, indent, text chunks of the open item]
+        self.table = []
+        self.fence = None    # (marker, language, lines) while inside a fenced block
+        self.blank = False   # A blank line was seen since the last text line
+
+    def flush_text(self):
+        if not self.paragraph:
+            return
+        text = render_inline(" ".join(self.paragraph))
+        self.paragraph = []
+        if self.lists:
+            item = self.lists[-1]
+            # The first text of an item goes straight into the <li>, later
+            # paragraphs (after a blank line) get their own <p>
+            self.out.append(text if item[2] == 0 else f"<p>{text}</p>")
+            item[2] += 1
+        else:
+            self.out.append(f"<p>{text}</p>")
+
+    def close_lists(self, keep=0):
+        self.flush_text()
+        while len(self.lists) > keep:
+            kind, _, _ = self.lists.pop()
+            self.out.append("</li></ul>" if kind == "bullet" else "</li></ol>")
+
+    def flush_table(self):
+        if self.table:
+            self.out.append(render_table(self.table))
+            self.table = []
+
+    def list_item(self, kind, indent, start, text):
+        self.flush_text()
+        while self.lists:
+            top_kind, top_indent, _ = self.lists[-1]
+            if indent > top_indent:
+                break
+            if indent == top_indent and top_kind == kind:
+                self.out.append("</li><li>")
+                self.lists[-1][2] = 0
+                self.paragraph.append(text)
+                return
+            if indent == top_indent and not any(k == kind and i == indent for k, i, _ in self.lists):
+                # ECSS style: "1." items directly below an "a." item, unindented
+                break
+            self.close_lists(len(self.lists) - 1)
+
+        tag = LIST_TAGS[kind]
+        if start not in (None, 1):
+            tag = tag[:-1] + f' start="{start}">'
+        self.out.append(tag + "<li>")
+        self.lists.append([kind, indent, 0])
+        self.paragraph.append(text)
+
+    def line(self, line):
+        if self.fence is not None:
+            marker, language, lines = self.fence
+            if line.strip().startswith(marker):
+                self.out.append(render_code(lines, language))
+                self.fence = None
+            else:
+                lines.append(line)
+            return
+
+        if not line.strip():
+            self.flush_text()
+            self.flush_table()
+            self.blank = True
+            return
+
+        fence = FENCE_PATTERN.match(line)
+        if fence:
+            self.flush_table()
+            self.close_lists()
+            self.fence = (fence.group(1), fence.group(2), [])
+            return
+
+        if line.lstrip().startswith("|"):
+            self.close_lists()
+            self.table.append(line)
+            return
+        self.flush_table()
+
+        item = LIST_ITEM_PATTERN.match(line)
+        if item:
+            self.blank = False
+            indent = _indent_width(item.group("indent"))
+            if item.group("bullet"):
+                self.list_item("bullet", indent, None, item.group("text"))
+            elif item.group("number") or item.group("pnumber"):
+                self.list_item("decimal", indent, int(item.group("number") or item.group("pnumber")), item.group("text"))
+            else:
+                letter = item.group("letter") or item.group("pletter")
+                self.list_item("alpha", indent, ord(letter) - ord("a") + 1, item.group("text"))
+            return
+
+        if self.lists and self.blank and _indent_width(line[:len(line) - len(line.lstrip())]) <= self.lists[-1][1]:
+            # Unindented text after a blank line ends the lists
+            self.close_lists()
+        self.blank = False
+        self.paragraph.append(line.strip())
+
+    def finish(self):
+        if self.fence is not None:
+            # An unterminated fence runs to the end of the section
+            marker, language, lines = self.fence
+            self.out.append(render_code(lines, language))
+            self.fence = None
+        self.flush_table()
+        self.close_lists()
+        return "".join(self.out)
+
+
+def render_storage(text):
+    """
+    Converts the Markdown text of one outline section to Confluence storage format.
+
+    Args:
+        text (str): The section content.
+
+    Returns:
+        str: The XHTML storage representation ('' for empty content).
+    """
+    writer = _StorageWriter()
+    for line in text.splitlines():
+        writer.line(line)
+    return writer.finish()
+
+
+class StorageRenderer:
+    """
+    render_storage with a memoization cache keyed on the SHA-256 of the
+    section text. Thread-safe, so it can be shared by the publishing threads
+    of several documents.
+
+    Parameters:
+    max_entries : int, number of rendered sections kept, least recently used
+                  dropped first (default: None, unbounded)
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text):
+        key = hashlib.sha256(text.encode("utf-8")).digest()
+        with self._lock:
+            storage = self._cache.get(key)
+            if storage is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return storage
+
+        storage = render_storage(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = storage
+            if self.max_entries is not None and len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return storage
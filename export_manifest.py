@@ -0,0 +1,153 @@
+# export_manifest.py
+
+# Local record of what a previous confTraverse.py run exported, so an
+# incremental run can skip pages and attachments whose Confluence version
+# has not changed since.
+#
+# The manifest is a JSON file in the export directory:
+#   {
+#     "layout":      2,
+#     "pages":       {page_id: {"version": 7, "title": "...", "filename": "Title.tex"}},
+#     "attachments": {attachment_id: {"version": 2, "size": 1234, "mtime_ns": ..., "sha256": "...",
+#                                     "filename": "attachments/<page_id>/..."}}
+#   }
+#
+# 'layout' is the export layout version. Exports before layout 2 kept all
+# attachments in one flat folder, where same-named attachments of different
+# pages overwrote each other; their manifest is not reused.
+
+import os
+import json
+import hashlib
+import threading
+
+MANIFEST_FILENAME = "export_manifest.json"
+EXPORT_LAYOUT = 2
+
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Returns the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExportManifest:
+    """
+    Page and attachment versions of the last export. All methods are
+    thread-safe, so the manifest can be shared by the traversal workers.
+
+    Parameters:
+    export_dir : str, directory holding the export and the manifest file
+    load       : bool, read the previous manifest (default: True); with False
+                 every page is treated as changed but a new manifest is
+                 still written on save()
+    """
+
+    def __init__(self, export_dir, load=True):
+        self.export_dir = export_dir
+        self.filepath = os.path.join(export_dir, MANIFEST_FILENAME)
+        self.pages = {}
+        self.attachments = {}
+        self._seen_pages = set()
+        self._lock = threading.Lock()
+        if load:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("layout", 1) != EXPORT_LAYOUT:
+                print(f"Export manifest '{self.filepath}' is from an older export layout. Running a full export.")
+                return
+            self.pages = data.get("pages", {})
+            self.attachments = data.get("attachments", {})
+            print(f"Loaded export manifest with {len(self.pages)} page(s) and {len(self.attachments)} attachment(s).")
+        except FileNotFoundError:
+            print(f"No export manifest found at '{self.filepath}'. Running a full export.")
+        except (ValueError, OSError) as e:
+            print(f"Could not read export manifest '{self.filepath}' ({e}). Running a full export.")
+
+    def knows_page(self, page_id):
+        """True if the previous export recorded this page."""
+        with self._lock:
+            return str(page_id) in self.pages
+
+    def page_is_current(self, page_id, version):
+        """True if the page was exported at this version and its .tex file is still there."""
+        with self._lock:
+            self._seen_pages.add(str(page_id))
+            entry = self.pages.get(str(page_id))
+        return (entry is not None and entry["version"] == version
+                and os.path.exists(os.path.join(self.export_dir, entry["filename"])))
+
+    def page_filename(self, page_id):
+        with self._lock:
+            return self.pages[str(page_id)]["filename"]
+
+    def page_filenames(self):
+        """The .tex files of all recorded pages."""
+        with self._lock:
+            return [entry["filename"] for entry in self.pages.values()]
+
+    def record_page(self, page_id, version, title, filename):
+        with self._lock:
+            self._seen_pages.add(str(page_id))
+            self.pages[str(page_id)] = {"version": version, "title": title, "filename": filename}
+
+    def attachment_is_current(self, attachment_id, version, size, filepath=None):
+        """
+        True if the attachment was downloaded at this version (to filepath,
+        if given) and the local copy still has the recorded contents. The
+        digest is only recomputed if the file's mtime changed.
+        """
+        with self._lock:
+            entry = self.attachments.get(str(attachment_id))
+        if entry is None or entry["version"] != version or entry["size"] != size:
+            return False
+        if filepath is not None and os.path.relpath(filepath, self.export_dir) != entry["filename"]:
+            return False
+        filepath = os.path.join(self.export_dir, entry["filename"])
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry.get("mtime_ns"):
+            return True
+        return file_sha256(filepath) == entry["sha256"]
+
+    def record_attachment(self, attachment_id, version, filepath, sha256=None):
+        """
+        Records a downloaded attachment; the path is stored relative to the
+        export directory. The digest is computed unless the caller already has it.
+        """
+        stat = os.stat(filepath)
+        entry = {
+            "version": version,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256 or file_sha256(filepath),
+            "filename": os.path.relpath(filepath, self.export_dir),
+        }
+        with self._lock:
+            self.attachments[str(attachment_id)] = entry
+
+    def save(self):
+        """
+        Writes the manifest, dropping pages that were not visited in this run
+        (deleted or moved out of the exported tree).
+        """
+        with self._lock:
+            if self._seen_pages:
+                self.pages = {pid: entry for pid, entry in self.pages.items() if pid in self._seen_pages}
+            data = {"layout": EXPORT_LAYOUT, "pages": self.pages, "attachments": self.attachments}
+            tmp_path = self.filepath + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.filepath)
+        print(f"Saved export manifest to '{self.filepath}'.")
@@ -0,0 +1,252 @@
+# image_normalizer.py
+
+# Image normalization stage shared by confTraverse.py and conf2tex.py.
+#
+# Confluence attachments go into the LaTeX builds as uploaded: screenshots
+# of many megapixels, TIFF scans and SVG diagrams that pdflatex either
+# cannot include or embeds at full size, bloating the PDF and the compile
+# time. Before they are placed in the build, images are:
+#
+#   - converted to a format pdflatex includes: GIF, BMP, TIFF and WebP to
+#     PNG (needs Pillow), SVG to PDF (needs rsvg-convert on the PATH);
+#   - downsampled when wider than the configured DPI at the printed width
+#     (needs Pillow), e.g. 200 dpi x 6.3 in = 1260 px.
+#
+# Results are kept in an on-disk cache keyed by the SHA-256 of the source
+# and the settings, so unchanged attachments are processed once across
+# builds (and across both exporters when they share the cache directory).
+# A format is only renamed when a converter for it is available, so without
+# Pillow images are placed as they are.
+#
+# Cache layout:
+#   <cache_dir>/ab/abcdef....png
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+import subprocess
+from collections import Counter
+from functools import lru_cache
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional
+    Image = None
+
+from export_manifest import file_sha256
+
+DEFAULT_CACHE_DIR = ".image_cache"
+
+# Formats pdflatex includes directly
+LATEX_IMAGE_FORMATS = {".png", ".jpg", ".jpeg", ".pdf"}
+# Formats converted to PNG with Pillow, and to PDF with rsvg-convert
+RASTER_CONVERT_FORMATS = {".gif", ".bmp", ".tif", ".tiff", ".webp"}
+VECTOR_CONVERT_FORMATS = {".svg"}
+IMAGE_FORMATS = LATEX_IMAGE_FORMATS | RASTER_CONVERT_FORMATS | VECTOR_CONVERT_FORMATS
+
+# Bumped when the processing changes, so earlier cache entries are not reused
+NORMALIZER_VERSION = 1
+
+GRAPHICS_PATTERN = re.compile(r"(\\includegraphics(?:\[[^\]]*\])?\{)([^}]*)(\})")
+
+
+@lru_cache(maxsize=None)
+def svg_converter():
+    """Path of rsvg-convert, or None if it is not installed."""
+    return shutil.which("rsvg-convert")
+
+
+class ImageSettings:
+    """
+    How images are normalized. Plain data, so it can be handed to worker
+    processes to compute the normalized filenames.
+
+    Parameters:
+    dpi          : int, resolution of a full-width image in the PDF (default: 200)
+    width_in     : float, printed width of a full-width image in inches (default: 6.3,
+                   the text width of A4 with 1 inch margins)
+    jpeg_quality : int, quality of downsampled JPEGs (default: 85)
+    """
+
+    def __init__(self, dpi=200, width_in=6.3, jpeg_quality=85):
+        self.dpi = dpi
+        self.width_in = width_in
+        self.jpeg_quality = jpeg_quality
+
+    @property
+    def max_width(self):
+        """Widest image kept at full resolution, in pixels."""
+        return max(1, round(self.dpi * self.width_in))
+
+    def key(self):
+        """The settings that change the normalized files, for cache keys and build manifests."""
+        return {"dpi": self.dpi, "width_in": self.width_in, "jpeg_quality": self.jpeg_quality,
+                "version": NORMALIZER_VERSION}
+
+    def target_filename(self, filename):
+        """The filename an image has once normalized, e.g. 'scan.tiff' -> 'scan.png'."""
+        stem, extension = os.path.splitext(filename)
+        extension = extension.lower()
+        if extension in RASTER_CONVERT_FORMATS and Image is not None:
+            return stem + ".png"
+        if extension in VECTOR_CONVERT_FORMATS and svg_converter():
+            return stem + ".pdf"
+        return filename
+
+    def target_filenames(self, filenames):
+        """
+        The normalized filenames of the files of one folder. A converted
+        image whose name would clash with another file's keeps its source
+        extension in the name, e.g. 'scan.tiff' -> 'scan-tiff.png' next to
+        'scan.png' (a dash, as older graphicx versions take a second dot for
+        the start of the extension).
+
+        Returns:
+            dict: filename -> normalized filename.
+        """
+        targets = {filename: self.target_filename(filename) for filename in filenames}
+        taken = Counter(targets.values())
+        for filename, target in targets.items():
+            if taken[target] > 1 and target != filename:
+                stem, extension = os.path.splitext(filename)
+                targets[filename] = f"{stem}-{extension[1:]}{os.path.splitext(target)[1]}"
+        return targets
+
+
+def rewrite_graphics(latex_content, placed):
+    """
+    Points the \\includegraphics commands of the images that were placed
+    at their normalized files, e.g. {attachments/42/scan.tiff} ->
+    {images/42/scan.png} with placed {'attachments/42/scan.tiff':
+    'images/42/scan.png'}. Every other image is left as it is, so running
+    it again changes nothing.
+    """
+    def replace(match):
+        name = match.group(2)
+        if name not in placed:
+            return match.group(0)
+        return f"{match.group(1)}{placed[name]}{match.group(3)}"
+    return GRAPHICS_PATTERN.sub(replace, latex_content)
+
+
+class ImageNormalizer:
+    """
+    Converts and downsamples images through the on-disk cache. Thread-safe;
+    Pillow releases the GIL while decoding and resampling, so images can be
+    processed in parallel from a thread pool (see ImagePlacer).
+
+    Parameters:
+    settings  : ImageSettings
+    cache_dir : str, directory of the normalized images (default: .image_cache)
+    """
+
+    def __init__(self, settings, cache_dir=DEFAULT_CACHE_DIR):
+        self.settings = settings
+        self.cache_dir = cache_dir
+        self._settings_key = json.dumps(settings.key(), sort_keys=True)
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        os.makedirs(cache_dir, exist_ok=True)
+        if Image is None:
+            print("Pillow is not installed: raster images are placed without conversion or downsampling "
+                  "(pip install Pillow).")
+
+    def _count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def _cache_path(self, source_path, extension):
+        key = hashlib.sha256(f"{file_sha256(source_path)}:{self._settings_key}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + extension)
+
+    def normalize(self, source_path):
+        """
+        Returns the path of the normalized image: a cache entry, or
+        source_path itself if the image needs no change. Returns None if the
+        image had to change format but could not be converted.
+        """
+        filename = os.path.basename(source_path)
+        extension = os.path.splitext(filename)[1].lower()
+        target_extension = os.path.splitext(self.settings.target_filename(filename))[1].lower()
+        try:
+            if extension in VECTOR_CONVERT_FORMATS and target_extension == ".pdf":
+                return self._convert_vector(source_path)
+            if Image is not None and extension in IMAGE_FORMATS - VECTOR_CONVERT_FORMATS - {".pdf"}:
+                return self._normalize_raster(source_path, extension, target_extension)
+        except Exception as e:
+            print(f"Could not normalize image '{source_path}': {e}")
+            self._count("failed")
+            return source_path if target_extension == extension else None
+        self._count("unchanged")
+        return source_path
+
+    def _cached(self, cache_path):
+        if os.path.exists(cache_path):
+            self._count("cached")
+            return True
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        return False
+
+    def _convert_vector(self, source_path):
+        cache_path = self._cache_path(source_path, ".pdf")
+        if self._cached(cache_path):
+            return cache_path
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        subprocess.run([svg_converter(), "-f", "pdf", "-o", tmp_path, source_path],
+                       check=True, capture_output=True)
+        os.replace(tmp_path, cache_path)
+        self._count("converted")
+        return cache_path
+
+    def _normalize_raster(self, source_path, extension, target_extension):
+        max_width = self.settings.max_width
+        with Image.open(source_path) as image:
+            # Only the header has been read so far
+            if extension == target_extension and image.width <= max_width:
+                self._count("unchanged")
+                return source_path
+
+            cache_path = self._cache_path(source_path, target_extension)
+            if self._cached(cache_path):
+                return cache_path
+
+            if image.format == "JPEG":
+                # Let the decoder scale down by up to 8x on the way in
+                image.draft("RGB", (max_width, max(1, image.height * max_width // image.width)))
+            image.seek(0)  # First frame of animations and multi-page TIFFs
+            image = image.convert(self._mode(image, target_extension))
+            downscaled = image.width > max_width
+            if downscaled:
+                height = max(1, round(image.height * max_width / image.width))
+                image = image.resize((max_width, height), Image.LANCZOS)
+
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            options = {"dpi": (self.settings.dpi, self.settings.dpi)}
+            if target_extension in (".jpg", ".jpeg"):
+                image.save(tmp_path, "JPEG", quality=self.settings.jpeg_quality, **options)
+            else:
+                image.save(tmp_path, "PNG", **options)
+            os.replace(tmp_path, cache_path)
+
+        self._count("downscaled" if downscaled else "converted")
+        return cache_path
+
+    @staticmethod
+    def _mode(image, target_extension):
+        """Pixel mode the image is saved in: JPEG has no alpha, PNG no CMYK."""
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        if target_extension in (".jpg", ".jpeg"):
+            return "L" if image.mode in ("1", "L") else "RGB"
+        if image.mode in ("1", "L", "RGB", "RGBA", "LA"):
+            return image.mode
+        return "RGBA" if has_alpha else "RGB"
+
+    def print_summary(self):
+        with self._lock:
+            counts = dict(self.counts)
+        if counts:
+            print("Image normalization: " + ", ".join(f"{counts.get(outcome, 0)} {outcome}" for outcome in
+                                                      ("converted", "downscaled", "cached", "unchanged", "failed")) + ".")
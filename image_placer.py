@@ -0,0 +1,115 @@
+# image_placer.py
+
+# Background placement of chapter images into the conf2tex.py output
+# directory.
+#
+# Exports with large CAD renders and scanned drawings can carry gigabytes
+# of attachments, and copying them into every LaTeX build duplicates all of
+# it. Images are instead placed with the cheapest method the filesystem
+# supports (see attachment_store.link_file) by a small thread pool, so the
+# file I/O overlaps the HTML extraction and the pandoc conversions. With an
+# ImageNormalizer the same threads convert and downsample the images first
+# (see image_normalizer.py) and the normalized files are placed instead.
+#
+# Strategies:
+#   auto     : hardlink, else reflink (copy-on-write clone), else copy
+#   hardlink : hardlink, else copy
+#   reflink  : reflink, else copy
+#   symlink  : symlink, else copy; the build then depends on the export
+#   copy     : always copy
+
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from attachment_store import link_file
+from chapter_manifest import files_identical
+
+STRATEGY_METHODS = {
+    "auto": ("hardlink", "reflink", "copy"),
+    "hardlink": ("hardlink", "copy"),
+    "reflink": ("reflink", "copy"),
+    "symlink": ("symlink", "copy"),
+    "copy": ("copy",),
+}
+
+
+class ImagePlacer:
+    """
+    Places images into an output directory in background threads, each
+    image once, skipping those whose placed file is already identical.
+
+    Parameters:
+    output_dir : str, the directory the images are placed in
+    strategy   : str, one of STRATEGY_METHODS (default: 'auto')
+    workers    : int, number of placement threads (default: 4)
+    normalizer : ImageNormalizer, converts and downsamples the images before
+                 they are placed (default: None, place them as they are)
+    """
+
+    def __init__(self, output_dir, strategy="auto", workers=4, normalizer=None):
+        if strategy not in STRATEGY_METHODS:
+            raise ValueError(f"Unknown image placement strategy '{strategy}'")
+        self.output_dir = output_dir
+        self.strategy = strategy
+        self.methods = STRATEGY_METHODS[strategy]
+        self.normalizer = normalizer
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._lock = threading.Lock()
+        self._queued = set()
+        self.counts = Counter()
+        self.failed = []
+        self.placed = set()
+
+    def place(self, images):
+        """
+        Queues the images (filename in output_dir -> source path) that were
+        not queued before. With a normalizer the filenames are expected to
+        be the normalized ones (ImageSettings.target_filename).
+        """
+        with self._lock:
+            new_images = {name: path for name, path in images.items() if name not in self._queued}
+            self._queued.update(new_images)
+        for image_filename, source_image_path in new_images.items():
+            self._executor.submit(self._place, image_filename, source_image_path)
+
+    def _place(self, image_filename, source_image_path):
+        dest_image_path = os.path.join(self.output_dir, image_filename)
+        try:
+            if self.normalizer is not None:
+                source_image_path = self.normalizer.normalize(source_image_path)
+                if source_image_path is None:
+                    raise OSError("the image could not be converted")
+            if files_identical(source_image_path, dest_image_path) and self._kept(dest_image_path):
+                method = "unchanged"
+            else:
+                method = link_file(source_image_path, dest_image_path, self.methods)
+        except OSError as e:
+            print(f"     ❌ Could not place image '{image_filename}': {e}")
+            with self._lock:
+                self.failed.append(image_filename)
+            return
+        with self._lock:
+            self.counts[method] += 1
+            self.placed.add(image_filename)
+
+    def _kept(self, dest_image_path):
+        # An identical image placed by another strategy is kept unless it is
+        # a symlink and symlinks were not asked for
+        return not os.path.islink(dest_image_path) or "symlink" in self.methods
+
+    def close(self):
+        """Waits for all queued images and prints how they were placed."""
+        self._executor.shutdown(wait=True)
+        if self.normalizer is not None:
+            self.normalizer.print_summary()
+        if self.counts or self.failed:
+            placed = ", ".join(f"{count} {method}" for method, count in sorted(self.counts.items()))
+            print(f"🖼️ Placed {sum(self.counts.values())} image(s) ({placed or 'none'}), {len(self.failed)} failed.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
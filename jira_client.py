@@ -0,0 +1,114 @@
+# jira_client.py
+
+# Minimal Jira REST client for sync_dates.py.
+#
+# The configuration is read once and every request goes through one
+# requests.Session, so the TLS handshake and the connection set-up are paid
+# once per run instead of once per issue, and the bearer token and CA
+# certificate are configured in a single place.
+
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class JiraClient:
+    """
+    Jira REST API v2 client over a pooled keep-alive session.
+
+    Parameters:
+    url         : str, Jira base URL, e.g. "https://jira.example.com"
+    token       : str, bearer token sent with every request
+    certificate : str or bool, CA bundle used to verify the server (requests' verify)
+    pool_size   : int, keep-alive connections kept to the server (default: 10)
+    """
+
+    def __init__(self, url, token, certificate=True, pool_size=10):
+        self.base_url = url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        })
+        self.session.verify = certificate
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_config(cls, jira_config, **kwargs):
+        """Creates a client from the JIRA section returned by sync_dates.read_config."""
+        return cls(jira_config['URL'], jira_config['TOKEN'], jira_config['CERTIFICATE'], **kwargs)
+
+    def issue_url(self, issue_key):
+        return f"{self.base_url}/rest/api/2/issue/{issue_key}"
+
+    def get_issue(self, issue_key, fields=None):
+        """
+        Retrieves one issue.
+
+        Args:
+            issue_key (str): The Jira issue key (e.g., "SAF-485").
+            fields (list): Field IDs to return (default: all fields).
+
+        Returns:
+            dict: The issue JSON.
+        """
+        params = {"fields": ",".join(fields)} if fields else None
+        response = self.session.get(self.issue_url(issue_key), params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def search_issues(self, jql, fields=None, page_size=100):
+        """
+        Yields all issues matching a JQL query, following the startAt/total
+        pagination of the search endpoint. The query is posted, so long
+        'key in (...)' lists are not limited by the URL length, and is not
+        validated, so keys that do not exist are skipped instead of failing
+        the whole search.
+
+        Args:
+            jql (str): The JQL query.
+            fields (list): Field IDs to return (default: the navigable fields).
+            page_size (int): Issues requested per call; Jira may cap it lower.
+
+        Yields:
+            dict: One issue JSON at a time.
+        """
+        start = 0
+        while True:
+            payload = {"jql": jql, "startAt": start, "maxResults": page_size, "validateQuery": False}
+            if fields:
+                payload["fields"] = fields
+            response = self.session.post(f"{self.base_url}/rest/api/2/search", data=json.dumps(payload))
+            response.raise_for_status()
+            data = response.json()
+            issues = data.get("issues", [])
+            yield from issues
+            start += len(issues)
+            if not issues or start >= data.get("total", 0):
+                return
+
+    def update_issue(self, issue_key, fields):
+        """
+        Sets fields of one issue.
+
+        Args:
+            issue_key (str): The Jira issue key.
+            fields (dict): Field ID -> new value.
+
+        Returns:
+            requests.Response: The response; Jira answers 204 on success.
+        """
+        return self.session.put(self.issue_url(issue_key), data=json.dumps({"fields": fields}))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
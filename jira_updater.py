@@ -0,0 +1,184 @@
+# jira_updater.py
+
+# Concurrent, rate-limited issue updates for sync_dates.py.
+#
+# A re-planned schedule can move hundreds of tasks at once. The updates are
+# sent by a small pool of worker threads over the shared JiraClient session,
+# paced by a token bucket so Jira's rate limiter is not tripped. Throttled
+# (429) and server-side (5xx) failures are retried with backoff, honouring
+# Retry-After, and every outcome ends up in a report that can be written as
+# JSON, so partial failures are never lost in the console output.
+#
+# Report:
+#   {
+#     "summary":   {"updated": 12, "unchanged": 180, "failed": 1},
+#     "updated":   [{"issue": "SAF-485", "fields": {...}, "attempts": 1}],
+#     "unchanged": ["SAF-486", ...],
+#     "failed":    [{"issue": "SAF-487", "status": 400, "reason": "..."}]
+#   }
+
+import json
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows 'rate' acquisitions per second on
+    average, with bursts of up to 'capacity'.
+
+    Parameters:
+    rate     : float, tokens added per second; must be greater than 0
+    capacity : int, maximum number of stored tokens (default: 1, no bursts)
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError(f"Token bucket rate must be greater than 0, got {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._resume = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._resume and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self._resume - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hands out no tokens for the next 'seconds' (e.g. after a 429)."""
+        with self._lock:
+            self._resume = max(self._resume, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+def retry_after_seconds(response):
+    """Returns the delay requested by a Retry-After header, or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class JiraUpdateExecutor:
+    """
+    Sends issue updates in parallel, rate-limited and retried, and collects
+    the outcome of each into a report.
+
+    Parameters:
+    jira    : JiraClient, the shared client (its session is used by all workers)
+    workers : int, number of parallel updates (default: 4)
+    rate    : float, maximum requests per second, retries included (default: 10)
+    burst   : int, requests allowed back to back before the rate applies (default: workers)
+    retries : int, retries per update on 429, 5xx and connection errors (default: 5)
+    backoff : float, first retry delay in seconds without Retry-After, doubled per attempt (default: 1)
+    """
+
+    def __init__(self, jira, workers=4, rate=10.0, burst=None, retries=5, backoff=1.0):
+        self.jira = jira
+        self.retries = retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate, burst or workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self.updated = []
+        self.unchanged = []
+        self.failed = []
+
+    def _update(self, issue_key, fields):
+        for attempt in range(1, self.retries + 2):
+            self.bucket.acquire()
+            try:
+                response = self.jira.update_issue(issue_key, fields)
+            except requests.exceptions.RequestException as e:
+                status, reason, delay = None, str(e), None
+            else:
+                if response.status_code in (200, 204):
+                    print(f"Issue {issue_key} updated successfully.")
+                    return {"issue": issue_key, "fields": fields, "attempts": attempt}, None
+                status, reason = response.status_code, response.text.strip()[:500]
+                if status not in RETRY_STATUS:
+                    break
+                delay = retry_after_seconds(response)
+                if status == 429:
+                    # Throttled: hold back every worker, not just this one
+                    self.bucket.pause(delay if delay is not None else self.backoff * 2 ** (attempt - 1))
+
+            if attempt > self.retries:
+                break
+            delay = delay if delay is not None else self.backoff * 2 ** (attempt - 1)
+            print(f"Retrying issue {issue_key} in {delay:.1f} s ({status or reason}).")
+            time.sleep(delay)
+
+        print(f"Failed to update issue {issue_key}: {status} - {reason}")
+        return None, {"issue": issue_key, "status": status, "reason": reason}
+
+    def _job(self, issue_key, fields):
+        try:
+            updated, failed = self._update(issue_key, fields)
+        except Exception as e:
+            updated, failed = None, {"issue": issue_key, "status": None, "reason": str(e)}
+        with self._lock:
+            if updated is not None:
+                self.updated.append(updated)
+            else:
+                self.failed.append(failed)
+
+    def submit(self, issue_key, fields):
+        """Queues an update of 'fields' (field ID -> value) of one issue."""
+        return self._executor.submit(self._job, issue_key, fields)
+
+    def record_unchanged(self, issue_key):
+        """Notes an issue that was already in sync, for the report."""
+        with self._lock:
+            self.unchanged.append(issue_key)
+
+    def close(self):
+        """Waits for all queued updates."""
+        self._executor.shutdown(wait=True)
+
+    def report(self):
+        with self._lock:
+            return {
+                "summary": {"updated": len(self.updated), "unchanged": len(self.unchanged), "failed": len(self.failed)},
+                "updated": sorted(self.updated, key=lambda entry: entry["issue"]),
+                "unchanged": sorted(self.unchanged),
+                "failed": sorted(self.failed, key=lambda entry: entry["issue"]),
+            }
+
+    def write_report(self, filepath, extra=None):
+        """Writes the report, with the entries of 'extra' added, as JSON and returns it."""
+        report = self.report()
+        report.update(extra or {})
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,215 @@
+# pandoc_converter.py
+
+# Shared HTML -> LaTeX conversion engine used by confTraverse.py and conf2tex.py.
+#
+# Every pypandoc.convert_text call forks a fresh pandoc process, and on large
+# exports the process start-up dominates the CPU time. PandocConverter spreads
+# conversions over a process pool sized to the number of cores and can
+# optionally glue several pages into a single pandoc invocation, separated by
+# a marker paragraph that is split back out of the LaTeX output afterwards.
+#
+# pandoc makes heading identifiers unique across everything it converts in
+# one call, so a second page with an "Introduction" heading would get
+# \label{introduction-1} and its in-page links would point at the first page.
+# Documents whose headings share an identifier are therefore never put into
+# the same pandoc call.
+#
+# The worker processes are started with forkserver (spawn where it is not
+# available), never forked from the caller: the exporters already run
+# download and image threads by then, and a child forked while one of them
+# holds a lock (stdout, imports, malloc) can hang on it for good.
+
+import os
+import re
+import html
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pypandoc
+
+# A paragraph made only of letters survives the HTML -> LaTeX conversion
+# verbatim on a line of its own, so it can be used to split a batch back.
+BATCH_DELIMITER = "SCRIBEPANDOCBATCHDELIMITERQXZ"
+
+HEADING_PATTERN = re.compile(r"<h([1-6])(\s[^>]*)?>(.*?)</h\1\s*>", re.IGNORECASE | re.DOTALL)
+ID_ATTRIBUTE_PATTERN = re.compile(r"""\bid\s*=\s*["']([^"']*)["']""", re.IGNORECASE)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+
+
+def process_pool_context():
+    """Multiprocessing context for worker pools started while other threads run."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def convert_html(html_content, extra_args=None):
+    """
+    Converts a single HTML string to LaTeX with one pandoc invocation.
+
+    Args:
+        html_content (str): The HTML to convert.
+        extra_args (list): Extra pandoc command line arguments.
+
+    Returns:
+        str: The LaTeX content.
+    """
+    return pypandoc.convert_text(html_content, 'latex', format='html', extra_args=extra_args or [])
+
+
+def auto_identifier(text):
+    """The identifier pandoc derives from a heading's text, e.g. '1. Scope & Purpose' -> 'scope-purpose'."""
+    text = re.sub(r"[^\w\s.-]", "", text)
+    text = re.sub(r"\s+", "-", text.strip()).lower()
+    for i, char in enumerate(text):
+        if char.isalpha():
+            return text[i:]
+    return "section"
+
+
+def heading_identifiers(html_content):
+    """
+    The identifiers pandoc gives the headings of an HTML document on its
+    own: the explicit id, or the one derived from the text, with '-1',
+    '-2', ... appended to repeats.
+    """
+    identifiers = set()
+    for match in HEADING_PATTERN.finditer(html_content):
+        explicit = ID_ATTRIBUTE_PATTERN.search(match.group(2) or "")
+        if explicit:
+            identifier = explicit.group(1)
+        else:
+            identifier = base = auto_identifier(html.unescape(TAG_PATTERN.sub("", match.group(3))))
+            count = 0
+            while identifier in identifiers:
+                count += 1
+                identifier = f"{base}-{count}"
+        identifiers.add(identifier)
+    return identifiers
+
+
+def split_on_shared_identifiers(html_documents):
+    """
+    Splits a batch into consecutive runs of documents that share no heading
+    identifier, so each run converts like its documents one by one.
+    """
+    runs = []
+    identifiers = set()
+    for html_content in html_documents:
+        document_identifiers = heading_identifiers(html_content)
+        if not runs or identifiers & document_identifiers:
+            runs.append([])
+            identifiers = set()
+        runs[-1].append(html_content)
+        identifiers |= document_identifiers
+    return runs
+
+
+def convert_html_batch(html_documents, extra_args=None):
+    """
+    Converts several HTML strings with as few pandoc invocations as the
+    heading identifiers allow (see split_on_shared_identifiers).
+
+    The documents of a run are joined with a delimiter paragraph and the
+    LaTeX output is split on it again. If pandoc merged or dropped a
+    delimiter (e.g. an unclosed tag spilling into the next page) the run is
+    converted page by page instead, so the result is always one LaTeX
+    string per input.
+
+    Returns:
+        list: The LaTeX content of every document, or None where the
+              conversion of that document failed.
+    """
+    return [latex for run in split_on_shared_identifiers(html_documents)
+            for latex in _convert_joined(run, extra_args)]
+
+
+def _convert_joined(html_documents, extra_args):
+    if len(html_documents) == 1:
+        return [_convert_or_none(html_documents[0], extra_args)]
+
+    joined = f"\n<p>{BATCH_DELIMITER}</p>\n".join(html_documents)
+    try:
+        latex = convert_html(joined, extra_args)
+        parts = latex.split(f"\n{BATCH_DELIMITER}\n")
+        if len(parts) == len(html_documents):
+            return [part.strip("\n") + "\n" for part in parts]
+    except Exception as e:
+        print(f"    - Batched pandoc conversion failed ({e}). Converting page by page.")
+
+    return [_convert_or_none(html, extra_args) for html in html_documents]
+
+
+def _convert_or_none(html_content, extra_args):
+    try:
+        return convert_html(html_content, extra_args)
+    except Exception as e:
+        print(f"An error occurred during conversion: {e}")
+        return None
+
+
+class PandocConverter:
+    """
+    Converts HTML to LaTeX through a pool of pandoc worker processes.
+
+    Parameters:
+    extra_args : list, extra pandoc arguments used for every conversion
+    workers    : int, size of the process pool (default: number of cores);
+                 1 runs pandoc in the calling process
+    batch_size : int, number of documents converted per pandoc invocation
+                 by convert_many (default: 1, i.e. no batching)
+    """
+
+    def __init__(self, extra_args=None, workers=None, batch_size=1):
+        self.extra_args = list(extra_args or [])
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None and self.workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=process_pool_context())
+        return self._pool
+
+    def convert(self, html_content):
+        """
+        Converts one HTML string to LaTeX. Safe to call from several threads
+        at once; the calls are then spread over the process pool.
+        Raises the pandoc error if the conversion fails.
+        """
+        pool = self._get_pool()
+        if pool is None:
+            return convert_html(html_content, self.extra_args)
+        return pool.submit(convert_html, html_content, self.extra_args).result()
+
+    def convert_many(self, html_documents):
+        """
+        Converts a list of HTML strings, batching and parallelizing as configured.
+
+        Returns:
+            list: LaTeX strings in the same order as the input, with None for
+                  documents whose conversion failed.
+        """
+        html_documents = list(html_documents)
+        batches = [html_documents[i:i + self.batch_size]
+                   for i in range(0, len(html_documents), self.batch_size)]
+
+        pool = self._get_pool()
+        if pool is None:
+            results = [convert_html_batch(batch, self.extra_args) for batch in batches]
+        else:
+            futures = [pool.submit(convert_html_batch, batch, self.extra_args) for batch in batches]
+            results = [future.result() for future in futures]
+
+        return [latex for batch_result in results for latex in batch_result]
+
+    def close(self):
+        """Shuts down the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,123 @@
+# schedule_changes.py
+
+# Change set files for sync_dates.py.
+#
+# The planning phase writes the Jira date changes a schedule requires; the
+# apply phase reads them back and sends them without looking at the
+# schedule or Jira again, so a change set can be reviewed (or edited) in
+# between. JSON keeps some context about the run, CSV opens in a
+# spreadsheet; the format follows the file extension.
+#
+# JSON:
+#   {
+#     "schedule": "SAFAR Project Schedule.xml",
+#     "created":  "2025-03-01T10:00:00",
+#     "changes":  [{"issue": "SAF-485", "name": "...",
+#                   "fields": {"duedate": {"from": "2025-04-01", "to": "2025-04-08"}}}]
+#   }
+#
+# CSV, one row per changed field:
+#   issue,name,field,from,to
+#
+# Next to the change set, '<change set>.sync.json' holds what the apply
+# phase records in the sync snapshot (see sync_snapshot.py): the schedule
+# values of every issue the plan compared, and the issues already in sync.
+#   {
+#     "values":    {"SAF-485": {"start": "2025-03-04", "finish": "2025-04-08"}},
+#     "unchanged": ["SAF-486"]
+#   }
+
+import os
+import csv
+import json
+import datetime
+
+CSV_COLUMNS = ["issue", "name", "field", "from", "to"]
+
+
+def _is_csv(filepath):
+    return os.path.splitext(filepath)[1].lower() == ".csv"
+
+
+def write_change_set(filepath, changes, schedule_file=None):
+    """
+    Writes planned changes as JSON, or as CSV if filepath ends in .csv.
+
+    Args:
+        filepath (str): The change set file.
+        changes (list): Dicts with issue, name and fields (field ID ->
+                        {'from': current Jira value, 'to': new value}).
+        schedule_file (str): The schedule the changes were planned from.
+    """
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        if _is_csv(filepath):
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            for change in changes:
+                for field, values in change["fields"].items():
+                    writer.writerow({"issue": change["issue"], "name": change.get("name", ""), "field": field,
+                                     "from": values.get("from") or "", "to": values["to"]})
+        else:
+            json.dump({
+                "schedule": schedule_file,
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "changes": changes,
+            }, f, indent=2)
+    os.replace(tmp_path, filepath)
+
+
+def sync_values_path(filepath):
+    """The file holding the synced values of a change set."""
+    return filepath + ".sync.json"
+
+
+def write_sync_values(filepath, values, unchanged):
+    """
+    Writes the synced values of a change set next to it.
+
+    Args:
+        filepath (str): The change set file.
+        values (dict): Issue key -> field name -> schedule value, for every
+                       issue compared while planning.
+        unchanged (list): The keys of the issues already in sync.
+    """
+    sync_path = sync_values_path(filepath)
+    tmp_path = sync_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"values": values, "unchanged": list(unchanged)}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, sync_path)
+
+
+def read_sync_values(filepath):
+    """
+    Reads the synced values written next to a change set.
+
+    Returns:
+        tuple: (values, unchanged) as passed to write_sync_values, or
+               ({}, []) if the change set has none (e.g. written by hand).
+    """
+    try:
+        with open(sync_values_path(filepath), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}, []
+    return data.get("values", {}), data.get("unchanged", [])
+
+
+def read_change_set(filepath):
+    """
+    Reads a change set written by write_change_set (or edited by hand).
+
+    Returns:
+        list: The changes, in file order; CSV rows of the same issue are
+              merged into one change.
+    """
+    with open(filepath, "r", encoding="utf-8", newline="") as f:
+        if not _is_csv(filepath):
+            return json.load(f)["changes"]
+        changes = {}
+        for row in csv.DictReader(f):
+            change = changes.setdefault(row["issue"], {"issue": row["issue"], "name": row.get("name", ""), "fields": {}})
+            change["fields"][row["field"]] = {"from": row.get("from") or None, "to": row["to"]}
+        return list(changes.values())
@@ -0,0 +1,198 @@
+# schedule_writer.py
+
+# Streaming rewrite of an MS Project XML export with some task values
+# replaced, used by the reconcile mode of sync_dates.py to bring Jira-side
+# changes back into the schedule.
+#
+# The file is copied event by event with SAX, so the rest of the schedule
+# (resources, assignments, timephased data) passes through without ever
+# being held in memory. Only the events of the <Task> being copied are
+# buffered, because its <Notes> (the Jira issue number) follow its <Start>
+# and <Finish>.
+#
+# The XML declaration keeps its version and standalone="yes" (the copy is
+# always UTF-8), and comments are passed through. A DOCTYPE, which MS
+# Project does not write, is dropped, and CDATA sections are written as
+# escaped text.
+
+import os
+import re
+import xml.sax
+import xml.sax.handler
+from xml.sax.saxutils import XMLGenerator
+
+XML_DECLARATION_PATTERN = re.compile(rb'^(?:\xef\xbb\xbf)?<\?xml\s[^>]*?\?>')
+DECLARATION_ATTRIBUTE_PATTERN = re.compile(rb'(version|encoding|standalone)\s*=\s*["\']([^"\']*)["\']')
+
+
+def _local_name(qname):
+    return qname.split(":")[-1]
+
+
+def read_xml_declaration(filepath):
+    """The attributes of a file's XML declaration, as a dict of str."""
+    with open(filepath, "rb") as f:
+        match = XML_DECLARATION_PATTERN.match(f.read(1024))
+    if match is None:
+        return {}
+    return {name.decode(): value.decode() for name, value in DECLARATION_ATTRIBUTE_PATTERN.findall(match.group(0))}
+
+
+class _ScheduleGenerator(XMLGenerator):
+    """XMLGenerator that writes a given XML declaration and comments."""
+
+    def __init__(self, out, declaration):
+        super().__init__(out, encoding="utf-8", short_empty_elements=True)
+        self.declaration = declaration
+
+    def startDocument(self):
+        # The copy is written in UTF-8 whatever the source encoding was
+        encoding = self.declaration.get("encoding", "utf-8")
+        if encoding.lower().replace("-", "") != "utf8":
+            encoding = "utf-8"
+        standalone = self.declaration.get("standalone")
+        standalone = f' standalone="{standalone}"' if standalone else ""
+        self._write(f'<?xml version="{self.declaration.get("version", "1.0")}" encoding="{encoding}"{standalone}?>\n')
+
+    def comment(self, content):
+        self._finish_pending_start_element()
+        self._write(f"<!--{content}-->")
+
+
+class _ScheduleRewriter(xml.sax.handler.ContentHandler, xml.sax.handler.LexicalHandler):
+
+    def __init__(self, out, task_updates, issue_key_for):
+        super().__init__()
+        self.out = out
+        self.task_updates = task_updates
+        self.issue_key_for = issue_key_for
+        self.depth = 0
+        self.task_events = None  # Buffered events of the current <Task>
+        self.updated = []
+
+    # Events outside a task go straight to the output
+    def startDocument(self):
+        self.out.startDocument()
+
+    def endDocument(self):
+        self.out.endDocument()
+
+    def startElement(self, name, attrs):
+        self.depth += 1
+        if self.task_events is None and self.depth == 3 and _local_name(name) == "Task":
+            self.task_events = []
+        if self.task_events is not None:
+            self.task_events.append(("start", name, dict(attrs)))
+        else:
+            self.out.startElement(name, attrs)
+
+    def endElement(self, name):
+        self.depth -= 1
+        if self.task_events is None:
+            self.out.endElement(name)
+            return
+        self.task_events.append(("end", name, None))
+        if self.depth == 2:
+            self._write_task(self.task_events)
+            self.task_events = None
+
+    def characters(self, content):
+        if self.task_events is not None:
+            self.task_events.append(("text", content, None))
+        else:
+            self.out.characters(content)
+
+    def ignorableWhitespace(self, content):
+        self.characters(content)
+
+    def processingInstruction(self, target, data):
+        self.out.processingInstruction(target, data)
+
+    def comment(self, content):
+        if self.task_events is not None:
+            self.task_events.append(("comment", content, None))
+        else:
+            self.out.comment(content)
+            if self.depth == 0:
+                # Whitespace around the root element is not reported
+                self.out.characters("\n")
+
+    def _child_texts(self, events):
+        """Text of the direct children of the buffered task, by local name."""
+        texts = {}
+        depth = 0
+        current = None
+        for kind, value, _ in events:
+            if kind == "start":
+                depth += 1
+                if depth == 2:
+                    current = _local_name(value)
+                    texts[current] = ""
+            elif kind == "end":
+                depth -= 1
+                current = None if depth < 2 else current
+            elif kind == "text" and depth == 2 and current is not None:
+                texts[current] += value
+        return texts
+
+    def _write_task(self, events):
+        texts = self._child_texts(events)
+        issue_key = self.issue_key_for(texts)
+        updates = self.task_updates.get(issue_key, {}) if issue_key else {}
+        if updates:
+            self.updated.append(issue_key)
+
+        depth = 0
+        replacing = None  # Element whose text is being replaced
+        for kind, value, attrs in events:
+            if kind == "start":
+                depth += 1
+                self.out.startElement(value, xml.sax.xmlreader.AttributesImpl(attrs))
+                if depth == 2 and _local_name(value) in updates:
+                    replacing = _local_name(value)
+                    self.out.characters(updates[replacing])
+            elif kind == "end":
+                if depth == 2:
+                    replacing = None
+                depth -= 1
+                self.out.endElement(value)
+            elif kind == "comment":
+                self.out.comment(value)
+            elif replacing is None:
+                self.out.characters(value)
+
+
+def write_schedule_updates(schedule_file, output_file, task_updates, issue_key_for):
+    """
+    Copies an MS Project XML export to output_file, replacing direct child
+    values of the linked tasks. output_file may be the schedule itself; it
+    is replaced only once the copy is complete. The XML declaration and
+    comments are kept.
+
+    Args:
+        schedule_file (str): The MS Project XML export.
+        output_file (str): Where to write the updated schedule.
+        task_updates (dict): Issue key -> {element name: new text}, e.g.
+                             {"SAF-485": {"Finish": "2025-04-08T17:00:00"}}.
+        issue_key_for (callable): Maps the texts of a task's direct children
+                                  (element name -> text) to its issue key,
+                                  or None for unlinked tasks.
+
+    Returns:
+        list: The issue keys whose task was updated.
+    """
+    tmp_path = output_file + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            rewriter = _ScheduleRewriter(_ScheduleGenerator(f, read_xml_declaration(schedule_file)),
+                                         task_updates, issue_key_for)
+            parser = xml.sax.make_parser()
+            parser.setContentHandler(rewriter)
+            parser.setProperty(xml.sax.handler.property_lexical_handler, rewriter)
+            parser.parse(schedule_file)
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return rewriter.updated
@@ -1,7 +1,20 @@
 from atlassian import Confluence
+import os
 import re
+import glob
+import time
+import hashlib
+import argparse
 import configparser
 import sys # For clean exit on config errors
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+
+from confluence_paging import iter_descendant_pages, iter_space_pages
+from confluence_storage import StorageRenderer
+
+# Page property holding the hash of the body SCRIBE last published to a page
+CONTENT_HASH_PROPERTY = "scribe-content-hash"
 
 # --- Function to read configuration ---
 def read_config(config_file='scribe.cfg'):
@@ -355,77 +368,479 @@ together with a reference to the system engineering plan.
 
 """
 
-# --- Function to parse the text description ---
-def parse_description(text):
-    pages = []
-    # Regex to find Markdown headings:
-    matches = re.findall(r"^(#+)\s*(.*?)\n(.*?)(?=\n#+|\Z)", text, re.MULTILINE | re.DOTALL)
-
-    for match in matches:
-        heading_hashes = match[0] # e.g., "#", "##"
-        level = len(heading_hashes) # Level is determined by the number of hashes
-        title = match[1].strip()
-        content = match[2].strip()
-
-        pages.append({
-            "level": level,
-            "title": title,
-            "content": content,
-            "parent_id": None # Will be filled later
-        })
-    return pages
-
-# --- Function to create Confluence pages ---
-def create_confluence_pages(parsed_pages, space_key, confluence_client):
-    level_page_ids = {} # To track parent page IDs for each level
-
-    for page_data in parsed_pages:
+# --- Functions to parse the text description ---
+# An ATX heading: 1+ hashes, whitespace, the title, optional closing hashes.
+# Requiring the whitespace keeps lines such as "#5 of the list" in the content.
+HEADING_PATTERN = re.compile(r"^(#+)[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$")
+FENCE_PATTERN = re.compile(r"^[ \t]*(```|~~~)")
+
+class PageTreeBuilder:
+    """
+    Links pages to their parent as they arrive: the closest preceding page
+    one level up. Used by the streaming parser and by build_page_tree.
+    """
+    def __init__(self):
+        self.children = {} # Parent index (None for Level 1) -> child indices
+        self.level_index = {} # Index of the current page at each level
+
+    def add(self, index, page_data):
+        """
+        Sets page_data['parent_index'].
+
+        Returns:
+            bool: False if the page has no parent one level up (it is then
+                  left out of the tree).
+        """
         level = page_data['level']
-        title = page_data['title']
-        content = page_data['content']
-        parent_id = None
-
-        # Determine parent_id
+        parent_index = None
         if level > 1:
-            parent_level = level - 1
-            if parent_level in level_page_ids:
-                parent_id = level_page_ids[parent_level]
-            else:
-                print(f"Skipping page '{title}': No parent (Level {parent_level}) found for current Level {level}. (Ensure hierarchy starts with Level 1 or higher levels have parents.)")
-                continue
+            if level - 1 not in self.level_index:
+                page_data['parent_index'] = None
+                return False
+            parent_index = self.level_index[level - 1]
+
+        page_data['parent_index'] = parent_index
+        self.children.setdefault(parent_index, []).append(index)
+        self.level_index[level] = index
+        # This page is now the "active" parent for its sub-levels
+        for l in [l for l in self.level_index if l > level]:
+            del self.level_index[l]
+        return True
+
+def iter_outline(lines):
+    """
+    Single-pass, line-oriented Markdown outline parser.
+
+    Args:
+        lines (iterable): Lines of the outline, e.g. an open file or sys.stdin.
+
+    Yields:
+        dict: One page record per heading, in document order, as soon as its
+              content is complete: level, title, content, index and the
+              parent_index of the page it belongs under. Text before the
+              first heading is ignored and headings inside fenced code
+              blocks are treated as content.
+    """
+    builder = PageTreeBuilder()
+    current = None
+    content = []
+    in_fence = False
+    index = 0
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_PATTERN.match(line)
+        if not match:
+            if current is not None:
+                content.append(line)
+            continue
+
+        if current is not None:
+            current['content'] = "\n".join(content).strip()
+            yield current
+        current = {
+            "level": len(match.group(1)), # Level is determined by the number of hashes
+            "title": match.group(2).strip(),
+            "content": "",
+            "parent_id": None, # Will be filled later
+            "index": index,
+        }
+        builder.add(index, current)
+        index += 1
+        content = []
+
+    if current is not None:
+        current['content'] = "\n".join(content).strip()
+        yield current
+
+def parse_outline_file(path):
+    """Streams the page records of an outline file; '-' reads from stdin."""
+    if path == "-":
+        yield from iter_outline(sys.stdin)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_outline(f)
 
+def parse_description(text):
+    return list(iter_outline(text.splitlines()))
+
+# --- Function to build the page hierarchy ---
+def build_page_tree(parsed_pages):
+    """
+    Links every parsed page to its parent: the closest preceding page one
+    level up. Pages without such a parent are reported and left out.
+
+    Returns:
+        dict: Parent index (None for Level 1 pages) -> list of child indices
+              in document order.
+    """
+    builder = PageTreeBuilder()
+    for index, page_data in enumerate(parsed_pages):
+        if not builder.add(index, page_data):
+            level = page_data['level']
+            print(f"Skipping page '{page_data['title']}': No parent (Level {level - 1}) found for current Level {level}. (Ensure hierarchy starts with Level 1 or higher levels have parents.)")
+    return builder.children
+
+def call_with_retry(action, label, retries=3, backoff=2.0):
+    """
+    Calls action(), retrying with exponential backoff on errors.
+    The last error is raised if all attempts fail.
+    """
+    for attempt in range(retries + 1):
         try:
-            print(f"Creating Level {level} page: '{space_key}/{title}' (Parent ID: {parent_id if parent_id else 'None'}) ...")
-            
-            response = confluence_client.create_page( # Use the passed client
-                space=space_key,
-                title=title,
-                body=content,
-                parent_id=parent_id
-            )
-          
-            page_id = response['id']
-            level_page_ids[level] = page_id
-            # Clear IDs for lower levels, as this new page is now the "active" parent for its sub-levels
-            for l in range(level + 1, max(level_page_ids.keys() or [level]) + 1):
-                level_page_ids.pop(l, None)
-            print(f"Created page '{title}' with ID: {page_id}")
+            return action()
         except Exception as e:
-            print(f"Error creating page '{title}': {e}")
-            continue
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"Error {label} ({e}). Retrying in {delay:.0f} s...")
+            time.sleep(delay)
+
+def create_page_with_retry(confluence_client, space_key, title, body, parent_id, retries=3, backoff=2.0):
+    """
+    Creates one page, retrying with exponential backoff on errors.
+
+    Returns:
+        str: The new page ID. The last error is raised if all attempts fail.
+    """
+    response = call_with_retry(
+        lambda: confluence_client.create_page(space=space_key, title=title, body=body, parent_id=parent_id),
+        f"creating page '{title}'", retries, backoff)
+    return response['id']
+
+# --- Functions for idempotent (upsert) publishing ---
+def content_hash(body):
+    """Returns the hash stored with a published page to detect content changes."""
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+def list_existing_pages(confluence_client, space_key, root_parent_id=None):
+    """
+    Lists the pages a republish may update, with one paginated listing: the
+    descendants of root_parent_id, or every page of the space. Confluence
+    titles are unique within a space, so pages are matched by title.
+
+    Returns:
+        dict: Title -> {'id', 'parent_id', 'hash', 'hash_version'}.
+    """
+    expand = f"ancestors,metadata.properties.{CONTENT_HASH_PROPERTY}"
+    if root_parent_id:
+        listing = iter_descendant_pages(confluence_client, root_parent_id, expand=expand)
+    else:
+        listing = iter_space_pages(confluence_client, space_key, expand=expand)
+
+    existing = {}
+    for page in listing:
+        prop = page.get('metadata', {}).get('properties', {}).get(CONTENT_HASH_PROPERTY) or {}
+        ancestors = page.get('ancestors') or []
+        existing[page['title']] = {
+            "id": page['id'],
+            "parent_id": ancestors[-1]['id'] if ancestors else None,
+            "hash": (prop.get('value') or {}).get('sha256'),
+            "hash_version": prop.get('version', {}).get('number'),
+        }
+    print(f"Found {len(existing)} existing page(s) to compare against.")
+    return existing
+
+def store_content_hash(confluence_client, page_id, digest, hash_version=None):
+    """Stores the content hash of a published page in its page property."""
+    data = {"key": CONTENT_HASH_PROPERTY, "value": {"sha256": digest}}
+    if hash_version is None:
+        confluence_client.set_page_property(page_id, data)
+    else:
+        data["version"] = {"number": hash_version + 1}
+        confluence_client.update_page_property(page_id, data)
+
+def upsert_page(confluence_client, space_key, title, body, parent_id, existing, retries=3):
+    """
+    Creates the page, updates it if its body or parent changed since it was
+    last published, or leaves it alone.
+
+    Returns:
+        tuple: (page_id, action) with action 'created', 'updated', 'moved'
+               (updated under a new parent) or 'unchanged'.
+    """
+    digest = content_hash(body)
+    current = existing.get(title)
+    if current is None:
+        page_id = create_page_with_retry(confluence_client, space_key, title, body, parent_id, retries)
+        record_content_hash(confluence_client, title, page_id, digest, None, retries)
+        return page_id, "created"
+
+    page_id = current['id']
+    moved = parent_id is not None and current['parent_id'] != parent_id
+    if current['hash'] == digest and not moved:
+        return page_id, "unchanged"
+
+    call_with_retry(lambda: confluence_client.update_page(page_id, title, body, parent_id=parent_id, always_update=True),
+                    f"updating page '{title}'", retries)
+    record_content_hash(confluence_client, title, page_id, digest, current['hash_version'], retries)
+    return page_id, "moved" if moved else "updated"
+
+def record_content_hash(confluence_client, title, page_id, digest, hash_version, retries=3):
+    """
+    Stores the content hash of a page that was just published. The page
+    itself is already in place, so a failure is only reported: the next
+    republish then finds no matching hash and updates the page again.
+    """
+    try:
+        call_with_retry(lambda: store_content_hash(confluence_client, page_id, digest, hash_version),
+                        f"storing content hash of '{title}'", retries)
+    except Exception as e:
+        print(f"Error storing content hash of '{title}' (ID: {page_id}): {e}. It will be republished next time.")
+
+# --- Function to create Confluence pages ---
+def create_confluence_pages(parsed_pages, space_key, confluence_client, max_workers=8, retries=3,
+                            existing=None, root_parent_id=None, renderer=None):
+    """
+    Creates the parsed pages with a bounded pool of worker threads. A page is
+    submitted as soon as its parent exists, so all pages of one depth are
+    created in parallel. Siblings finish in any order, and Confluence lists
+    pages without a manual position alphabetically, so each group of
+    siblings with a created or moved page is put in document order afterwards.
+
+    With 'existing' (see list_existing_pages) pages are upserted instead:
+    only new pages are created and only pages whose content changed are
+    updated. Level 1 pages are placed under root_parent_id if given.
+
+    With a renderer (see confluence_storage.StorageRenderer) the Markdown
+    content is converted to Confluence storage format; without one it is
+    sent as is.
+
+    Returns:
+        list: The page ID for each parsed page, None where the page (or one
+              of its ancestors) could not be published.
+    """
+    children = build_page_tree(parsed_pages)
+    page_ids = [None] * len(parsed_pages)
+    actions = {"created": 0, "updated": 0, "moved": 0, "unchanged": 0}
+    reorder = set() # Parent indices whose children need to be put back in order
+
+    def create(index, parent_id):
+        page_data = parsed_pages[index]
+        page_data['parent_id'] = parent_id
+        body = renderer.render(page_data['content']) if renderer is not None else page_data['content']
+        if existing is not None:
+            page_id, action = upsert_page(confluence_client, space_key, page_data['title'], body,
+                                          parent_id, existing, retries)
+            if action != "unchanged":
+                print(f"{action.capitalize()} Level {page_data['level']} page '{page_data['title']}' (ID: {page_id})")
+            return page_id, action
+        print(f"Creating Level {page_data['level']} page: '{space_key}/{page_data['title']}' (Parent ID: {parent_id if parent_id else 'None'}) ...")
+        page_id = create_page_with_retry(confluence_client, space_key, page_data['title'], body, parent_id, retries)
+        print(f"Created page '{page_data['title']}' with ID: {page_id}")
+        return page_id, "created"
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(create, index, root_parent_id): index for index in children.get(None, [])}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    page_id, action = future.result()
+                except Exception as e:
+                    print(f"Error creating page '{parsed_pages[index]['title']}': {e}")
+                    skipped = count_descendants(children, index)
+                    if skipped:
+                        print(f"  Skipping {skipped} page(s) below '{parsed_pages[index]['title']}'.")
+                    continue
+                page_ids[index] = page_id
+                actions[action] += 1
+                if action in ("created", "moved"):
+                    reorder.add(parsed_pages[index]['parent_index'])
+                for child_index in children.get(index, []):
+                    pending[pool.submit(create, child_index, page_id)] = child_index
+
+        # Restore document order among siblings; groups are independent of each other
+        order_jobs = []
+        for parent_index in reorder:
+            parent_id = page_ids[parent_index] if parent_index is not None else root_parent_id
+            order_jobs.append(pool.submit(order_siblings, confluence_client, space_key, parent_id,
+                                          [page_ids[i] for i in children[parent_index] if page_ids[i]]))
+        for job in order_jobs:
+            job.result()
+
+    print(f"Pages created: {actions['created']}, updated: {actions['updated'] + actions['moved']}, unchanged: {actions['unchanged']}.")
+    return page_ids
+
+def count_descendants(children, index):
+    return sum(1 + count_descendants(children, child) for child in children.get(index, []))
+
+def order_siblings(confluence_client, space_key, parent_id, sibling_ids):
+    """
+    Puts the siblings in list order: appends them to their parent one by
+    one, or without a parent (top-level pages of the space) moves each
+    below the one before it.
+    """
+    if len(sibling_ids) < 2:
+        return
+    previous_id = None
+    for page_id in sibling_ids:
+        try:
+            if parent_id:
+                confluence_client.move_page(space_key, page_id, target_id=parent_id, position="append")
+            elif previous_id:
+                confluence_client.move_page(space_key, page_id, target_id=previous_id, position="below")
+        except Exception as e:
+            print(f"Error ordering page {page_id} under {parent_id or space_key}: {e}")
+            return
+        previous_id = page_id
+
+# --- Functions for publishing several outlines in one run ---
+def configure_connection_pool(confluence_client, pool_size):
+    """
+    Lets the client's shared requests session keep up to pool_size
+    keep-alive connections, so concurrent publishing threads reuse
+    connections instead of opening new ones.
+    """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    confluence_client.session.mount("https://", adapter)
+    confluence_client.session.mount("http://", adapter)
+
+def collect_outline_paths(inputs):
+    """
+    Expands the command line inputs: directories to the *.md files they
+    contain, glob patterns to their matches. '-' (stdin) is kept as is.
+    """
+    paths = []
+    for item in inputs:
+        if item == "-":
+            paths.append(item)
+        elif os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, "*.md"))))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    # Keep the first occurrence of each file, however it was named
+    return list(dict.fromkeys(path if path == "-" else os.path.normpath(path) for path in paths))
+
+def document_title(path):
+    """Title of an outline's document page, from its file name (e.g. 'PMPoutline')."""
+    if path == "-":
+        return "stdin"
+    return os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+
+def publish_document(path, space_key, confluence_client, max_workers=8, existing=None,
+                     root_parent_id=None, document_page=False, prefix_titles=False, renderer=None):
+    """
+    Parses one outline file and publishes it. With document_page the outline
+    goes below a page named after the file; with prefix_titles every page
+    title starts with the document title, so that several ECSS skeletons
+    with the same chapter names can live in one space.
+
+    Returns:
+        list: Page IDs of the published outline pages.
+    """
+    title = document_title(path)
+    parsed_pages = list(parse_outline_file(path))
+    print(f"[{title}] Found {len(parsed_pages)} pages to publish.")
+    if prefix_titles:
+        for page_data in parsed_pages:
+            page_data['title'] = f"{title}: {page_data['title']}"
+
+    parent_id = root_parent_id
+    if document_page:
+        if existing is not None:
+            parent_id, _ = upsert_page(confluence_client, space_key, title, "", root_parent_id, existing)
+        else:
+            parent_id = create_page_with_retry(confluence_client, space_key, title, "", root_parent_id)
+        print(f"[{title}] Document page ID: {parent_id}")
+
+    return create_confluence_pages(parsed_pages, space_key, confluence_client, max_workers=max_workers,
+                                   existing=existing, root_parent_id=parent_id, renderer=renderer)
+
+def publish_documents(paths, space_key, confluence_client, documents=4, max_workers=8, existing=None,
+                      root_parent_id=None, document_pages=False, prefix_titles=False, renderer=None):
+    """
+    Publishes several outlines concurrently (up to 'documents' at a time),
+    all through the same authenticated client and connection pool. A shared
+    renderer renders sections repeated across documents only once.
+
+    Returns:
+        dict: Path -> list of page IDs, or None if the document failed.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=documents) as pool:
+        futures = {pool.submit(publish_document, path, space_key, confluence_client, max_workers, existing,
+                               root_parent_id, document_pages, prefix_titles, renderer): path
+                   for path in paths}
+        for future in futures:
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                print(f"Error publishing '{path}': {e}")
+                results[path] = None
+
+    failed = [path for path, page_ids in results.items() if page_ids is None]
+    print(f"Published {len(paths) - len(failed)} of {len(paths)} document(s).")
+    for path in failed:
+        print(f"  Failed: {path}")
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Publish Markdown outlines as Confluence page trees.")
+    parser.add_argument("outlines", nargs="*",
+                        help="Markdown outlines, directories of *.md files or glob patterns; "
+                             "'-' reads one outline from stdin (default: the built-in sample)")
+    parser.add_argument("-c", "--config", default="scribe.cfg",
+                        help="Configuration file (default: scribe.cfg)")
+    parser.add_argument("-p", "--parent-id", default=None,
+                        help="ID of the page to publish under (default: top level of the space)")
+    parser.add_argument("-u", "--upsert", action="store_true",
+                        help="Update existing pages whose content changed instead of creating duplicates")
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="Number of pages published in parallel per document (default: 8)")
+    parser.add_argument("-d", "--documents", type=int, default=4,
+                        help="Number of outlines published in parallel (default: 4)")
+    parser.add_argument("--document-pages", action="store_true",
+                        help="Publish each outline below a page named after its file")
+    parser.add_argument("--prefix-titles", action="store_true",
+                        help="Prefix page titles with the document name to keep them unique in the space")
+    parser.add_argument("--raw", action="store_true",
+                        help="Send the Markdown content as is instead of rendering it to Confluence storage format")
+    return parser.parse_args()
 
 # --- Main execution ---
 if __name__ == "__main__":
-    confluence_cfg, auth_cfg = read_config()
+    args = parse_args()
+    confluence_cfg, auth_cfg = read_config(args.config)
 
     # Initialize Confluence client once
     confluence_client = get_confluence_client(confluence_cfg, auth_cfg)
     if not confluence_client: # get_confluence_client might exit, but double check
         sys.exit(1)
 
-    print("Parsing text description...")
-    parsed_pages = parse_description(text_description)
-    print(f"Found {len(parsed_pages)} pages to create.")
+    outline_paths = collect_outline_paths(args.outlines)
+    if args.outlines and not outline_paths:
+        print("Error: No outline files found.")
+        sys.exit(1)
 
-    create_confluence_pages(parsed_pages, confluence_cfg['SPACE_KEY'], confluence_client)
+    # All documents share the client, so size its pool for every publishing thread
+    configure_connection_pool(confluence_client, args.workers * max(1, min(args.documents, len(outline_paths))))
+
+    existing = None
+    if args.upsert:
+        existing = list_existing_pages(confluence_client, confluence_cfg['SPACE_KEY'], args.parent_id)
+
+    renderer = None if args.raw else StorageRenderer()
+
+    if outline_paths:
+        publish_documents(outline_paths, confluence_cfg['SPACE_KEY'], confluence_client,
+                          documents=args.documents, max_workers=args.workers, existing=existing,
+                          root_parent_id=args.parent_id, document_pages=args.document_pages,
+                          prefix_titles=args.prefix_titles, renderer=renderer)
+    else:
+        print("Parsing text description...")
+        parsed_pages = parse_description(text_description)
+        print(f"Found {len(parsed_pages)} pages to create.")
+        create_confluence_pages(parsed_pages, confluence_cfg['SPACE_KEY'], confluence_client,
+                                max_workers=args.workers, existing=existing, root_parent_id=args.parent_id,
+                                renderer=renderer)
+
+    if renderer is not None:
+        print(f"Rendered {renderer.misses} section(s) to storage format, {renderer.hits} reused from the cache.")
   
@@ -1,16 +1,16 @@
 import xml.etree.ElementTree as ET
 import json
 import requests
+import argparse
 import configparser
 import sys
 
-
-def is_number(value):
-    try:
-        float(value)  # Works for int, float, scientific notation
-        return True
-    except (ValueError, TypeError):
-        return False
+from jira_client import JiraClient
+from jira_updater import JiraUpdateExecutor
+from schedule_changes import read_change_set, write_change_set, read_sync_values, write_sync_values, sync_values_path
+from sync_snapshot import SyncSnapshot
+from schedule_writer import write_schedule_updates
+from sync_mapping import read_sync_mapping, parse_element
 
 
 # --- Function to read configuration ---
@@ -51,145 +51,415 @@ def read_config(config_file='scribe.cfg'):
     return confluence_config
 
 
-def retrieve_jira_info(issue_key):
+def prefetch_jira_fields(jira, issue_keys, jira_fields, batch_size=100):
     """
-    Retrieve Jira issue details by issue key.
-    
+    Fetches the mapped fields of many issues with a few JQL searches
+    ('key in (...)', batch_size keys each) instead of one GET per issue.
+
     Args:
-        issue_key (str): The Jira issue key (e.g., "SAF-485").
-    
+        jira (JiraClient): The shared Jira client.
+        issue_keys (list): Jira issue keys, e.g. ["SAF-485", "SAF-486"].
+        jira_fields (list): Jira field IDs to return (SyncMapping.jira_fields).
+        batch_size (int): Keys per search query.
+
     Returns:
-        dict: The JSON fields for the issue.
-    """
-    
-    # Read configuration file 
-    jcfg = read_config()   # scrbie.cfg by defintion, so far all in one directory. 
-    # Jira connection settings
-    JIRA_BASE_URL = jcfg["URL"] # "https://jira.tii.ae"  # Change to your Jira instance
-    API_ENDPOINT = f"/rest/api/2/issue/{issue_key}"
-    TOKEN = jcfg["TOKEN"]     # Replace with your token
-    CERT_PATH = jcfg['CERTIFICATE']          # Or True to verify with system CA
-
-    # Build the request
-    url = JIRA_BASE_URL + API_ENDPOINT
-    headers = {
-        "Authorization": f"Bearer {TOKEN}",
-        "Accept": "application/json",
-        "Content-Type": "application/json"
-    }
+        dict: Issue key -> fields dict. Keys Jira does not know (or that
+              could not be fetched) are missing.
+    """
+    keys = list(dict.fromkeys(issue_keys))
+    issues = {}
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        jql = f"key in ({','.join(batch)})"
+        try:
+            for issue in jira.search_issues(jql, fields=jira_fields, page_size=batch_size):
+                issues[issue["key"]] = issue.get("fields", {})
+        except requests.exceptions.RequestException as e:
+            print(f"Error connecting to Jira: {e}")
+        except json.JSONDecodeError as e:
+            print(f"Error parsing Jira response: {e}")
+    print(f"Fetched {len(issues)} of {len(keys)} issue(s) with {(len(keys) + batch_size - 1) // batch_size} search(es).")
+    return issues
 
-    try:
-        response = requests.get(url, headers=headers, verify=CERT_PATH )
-        response.raise_for_status()  # Raise for 4xx/5xx errors
-        issue_data = response.json()
-        return issue_data.get("fields", {})  # Return only fields
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to Jira: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"Error parsing Jira response: {e}")
-        return None
 
+def iter_schedule_tasks(schedule_file, elements=("Notes", "Start", "Finish")):
+    """
+    Streams the tasks of an MS Project XML export with iterparse.
+
+    Every <Task> is reduced to a small dict as soon as it has been parsed,
+    and every finished element below the collections (tasks, resources,
+    assignments with their baselines and timephased data) is cleared and
+    dropped from the tree, so memory stays bounded whatever the file size.
+
+    Args:
+        schedule_file (str): The MS Project XML export.
+        elements (list): Task elements to collect: direct children such as
+                         'Start', or baseline values such as 'Baseline[0]/Finish'.
+
+    Yields:
+        dict: name, outline_number, outline_level ('N/A' where the task has
+              no such element) and elements: element -> text (None if missing).
+    """
+    direct = {}
+    nested = {}
+    for element in elements:
+        tag, number, child = parse_element(element)
+        if child is None:
+            direct[tag] = element
+        else:
+            nested.setdefault(tag, {}).setdefault(number, {})[child] = element
+
+    namespace = ""
+    path = []  # Elements from the root to the current one
+    for event, elem in ET.iterparse(schedule_file, events=("start", "end")):
+        if event == "start":
+            if not path and "}" in elem.tag:
+                namespace = elem.tag.split("}")[0] + "}"
+            path.append(elem)
+            continue
+
+        path.pop()
+        if len(path) != 2:
+            # Keep the elements above <Task> (and the ones inside it until
+            # the task is complete); everything else is handled below
+            continue
+
+        parent = path[-1]
+        if elem.tag == namespace + "Task" and parent.tag == namespace + "Tasks":
+            task = {"name": "N/A", "outline_number": "N/A", "outline_level": "N/A",
+                    "elements": dict.fromkeys(elements)}
+            for child in elem:
+                tag = child.tag[len(namespace):]
+                if tag == "Name":
+                    task["name"] = child.text or ""
+                elif tag == "OutlineNumber":
+                    task["outline_number"] = child.text or ""
+                elif tag == "OutlineLevel":
+                    task["outline_level"] = child.text or ""
+                if tag in direct:
+                    task["elements"][direct[tag]] = child.text or ""
+                elif tag in nested:
+                    number = child.findtext(namespace + "Number")
+                    for child_tag, element in nested[tag].get(number, {}).items():
+                        task["elements"][element] = child.findtext(namespace + child_tag)
+            yield task
+        # Each finished record is the first child left, so removing it is cheap
+        elem.clear()
+        parent.remove(elem)
 
-def update_jira_fields(issue_key, sd_value, due_date):
+
+def read_schedule_tasks(schedule_file, mapping):
     """
-    Updates two fields in a Jira issue: 'sd' (custom field) and 'duedate'.
+    Reads the tasks of an MS Project XML export that are linked to a Jira
+    issue (by default the issue number is kept in the task notes) and have
+    fields to sync at their outline level.
+
+    Returns:
+        list: One dict per linked task: issue_key, name, outline_number,
+              outline_level, task_type, fields (the FieldMapping objects to
+              sync) and values (field name -> schedule text).
+    """
+    tasks = []
+    for task in iter_schedule_tasks(schedule_file, mapping.elements):
+        issue_key = mapping.issue_key(task["elements"])
+        if issue_key is None:
+            continue
+        task_type, fields = mapping.level_rule(task["outline_level"])
+        if not fields:
+            continue
+        elements = task.pop("elements")
+        task.update({
+            "issue_key": issue_key,
+            "task_type": task_type,
+            "fields": fields,
+            "values": {field.name: elements.get(field.element) for field in fields},
+        })
+        tasks.append(task)
+    return tasks
+
+
+def schedule_values(task):
+    """Field name -> value to sync, for the fields the schedule has a value for."""
+    values = {}
+    for field in task["fields"]:
+        value = field.to_jira(task["values"][field.name])
+        if value is not None:
+            values[field.name] = value
+    return values
+
+
+def plan_changes(tasks, jira_issues):
+    """
+    Compares the schedule with Jira, without writing anything.
+
+    Every mapped field of a task is checked independently, and only the
+    fields that differ are part of its change, so all of them go to Jira in
+    one update per issue.
 
     Args:
-        issue_key (str): Jira issue key, e.g. 'PROJ-123'
-        sd_value (str): Value for the SD field (string or other data type depending on the field type)
-        due_date (str): Due date in 'YYYY-MM-DD' format
-   
-    """
-
- # Jira connection settings
-      # Read configuration file 
-    jcfg = read_config()   # scrbie.cfg by defintion, so far all in one directory. 
-    # Jira connection settings
-    JIRA_BASE_URL = jcfg["URL"] # "https://jira.tii.ae"  # Change to your Jira instance
-    API_ENDPOINT = f"/rest/api/2/issue/{issue_key}"
-    TOKEN = jcfg["TOKEN"]    # Replace with your token
-    CERT_PATH = jcfg['CERTIFICATE']          # Or True to verify with system CA
-
-    # Build the request
-    url = JIRA_BASE_URL + API_ENDPOINT
-    
-    # Replace 'customfield_XXXXX' with the real SD field ID from your Jira instance
-    payload = {
-        "fields": {
-            "customfield_10015": sd_value,
-            "duedate": due_date
-        }
-    }
-
-    headers = {
-         "Content-Type": "application/json",
-         "Authorization": f"Bearer {TOKEN}", 
-         "Accept": "application/json"
-    }
-
-    # print( url, headers, sd_value, due_date)
-    response= requests.put(url, headers=headers, data=json.dumps(payload),  verify= CERT_PATH )
-    
-    if response.status_code == 204:
-        print(f"Issue {issue_key} updated successfully.")
-    else:
-        print(f"Failed to update issue {issue_key}: {response.status_code} - {response.text}")
-
-# THis is a simple function to compare times 
-def compare_first_10(str1, str2):
-    if str1 is None or str2 is None or str1 == "None" or str2 == "None":
-        return False
-    return str1[:10] == str2[:10]
-
-# Load and parse the XML file
-tree = ET.parse('SAFAR Project Schedule.xml')
-root = tree.getroot()
-
-# Namespace handling (if any)
-namespaces = {'ns': root.tag.split('}')[0].strip('{')} if '}' in root.tag else {}
-
-
-# Extract task information
-tasks = []
-
-for task in root.findall('.//ns:Task', namespaces):
-    name = task.findtext('ns:Name', default='N/A', namespaces=namespaces)
-    notes = task.findtext('ns:Notes', default='N/A', namespaces=namespaces)
-    ms_start = task.findtext('ns:Start', default='N/A', namespaces=namespaces)
-    ms_finish = task.findtext('ns:Finish', default='N/A', namespaces=namespaces)
-    outline1 = task.findtext('ns:OutlineNumber', default='N/A', namespaces=namespaces)
-    outline2 = task.findtext('ns:OutlineLevel', default='N/A', namespaces=namespaces)
-    if is_number(notes):
-        n = int(outline2)
-        task_type = ["Work Package", "Epic", "Story", "Task", "Subtask"][n-3] if 1 <= n <= 6 else None
-        issue_key = f"SAF-{notes}"
-        
-        # Don't update work packages or EPics - apparently they rolled up. 
-        # if task_type == "Work Package" : continue 
-        
-        fields = retrieve_jira_info(issue_key)
-        j_start_date = fields.get("customfield_10015")
-        j_end_date = fields.get("duedate")
-        print(issue_key, ":", name, ms_start, ms_finish, outline2, task_type)
-        print("JIRA", j_start_date, j_end_date)
-        
-    
-        
-        if compare_first_10(ms_start, j_start_date):
-            print('Data synced ok')
+        tasks (list): Tasks from read_schedule_tasks.
+        jira_issues (dict): Issue key -> fields, from prefetch_jira_fields.
+
+    Returns:
+        tuple: (changes, unchanged) - the changes in the format of
+               schedule_changes.write_change_set, and the keys of the
+               issues already in sync.
+    """
+    changes = []
+    unchanged = []
+    for task in tasks:
+        issue_key = task["issue_key"]
+        fields = jira_issues.get(issue_key)
+        if fields is None:
+            print(issue_key, ": not found in Jira, skipped")
             continue
+
+        changed = {}
+        values = schedule_values(task)
+        for field in task["fields"]:
+            if field.name not in values:
+                continue  # No value in the schedule, leave Jira alone
+            jira_value = field.jira_value(fields)
+            if not field.same(values[field.name], jira_value):
+                changed[field.jira_field] = {"from": jira_value, "to": values[field.name]}
+
+        if changed:
+            print(issue_key, ":", task["name"], "need update:",
+                  ", ".join(f"{field} from {values['from']} to {values['to']}" for field, values in changed.items()))
+            changes.append({"issue": issue_key, "name": task["name"], "fields": changed})
         else:
-            print(issue_key, ' Need update: from', j_start_date, 'to', ms_start[:10])
-        
-        if compare_first_10(ms_finish, j_end_date):
-            print('Data synced ok')
+            unchanged.append(issue_key)
+    return changes, unchanged
+
+
+def plan_schedule(jira, schedule_file, mapping, batch_size=100, snapshot=None, full=False):
+    """
+    Reads the schedule and the mapped Jira fields of its issues and plans the changes.
+
+    With a snapshot (a SyncSnapshot) only tasks whose schedule values changed
+    since their last successful sync are compared, unless full is set; the
+    values of every compared task are staged on the snapshot.
+    """
+    tasks = read_schedule_tasks(schedule_file, mapping)
+    print(f"Found {len(tasks)} task(s) linked to Jira issues.")
+
+    if snapshot is not None:
+        if not full:
+            total = len(tasks)
+            tasks = [task for task in tasks if not snapshot.is_current(task["issue_key"], schedule_values(task))]
+            print(f"{len(tasks)} of {total} task(s) changed since the last sync.")
+        for task in tasks:
+            snapshot.stage(task["issue_key"], schedule_values(task))
+
+    # One bulk lookup of all fields instead of one GET per task
+    jira_issues = prefetch_jira_fields(jira, [task["issue_key"] for task in tasks], mapping.jira_fields, batch_size)
+
+    changes, unchanged = plan_changes(tasks, jira_issues)
+    print(f"{len(changes)} issue(s) need an update, {len(unchanged)} already in sync.")
+    return changes, unchanged
+
+
+def plan_reconciliation(tasks, jira_issues, snapshot):
+    """
+    Three-way comparison of the schedule, Jira and the values of the last
+    successful sync (the snapshot), field by field:
+
+      schedule == Jira               in sync
+      only the schedule changed      push the schedule value to Jira
+      only Jira changed              write the Jira value back to the schedule
+      both changed                   conflict, reported and left alone
+
+    A field never synced before has no base to compare with; the schedule
+    wins, as in a normal sync. So does a field that cannot be written back
+    (baseline values, durations). Pushed and in-sync values are staged on
+    the snapshot. Written back and conflicting values are not: the snapshot
+    keeps the last agreed value until the updated schedule is exported again.
+
+    Returns:
+        tuple: (changes, schedule_updates, conflicts, unchanged) - the Jira
+               changes in change set format, issue key -> {element: text}
+               for write_schedule_updates, conflict dicts, and the keys of
+               the issues already in sync.
+    """
+    changes = []
+    schedule_updates = {}
+    conflicts = []
+    unchanged = []
+    for task in tasks:
+        issue_key = task["issue_key"]
+        fields = jira_issues.get(issue_key)
+        if fields is None:
+            print(issue_key, ": not found in Jira, skipped")
+            continue
+
+        base = snapshot.values(issue_key)
+        values = schedule_values(task)
+        to_jira = {}
+        to_schedule = {}
+        staged = {}
+        for field in task["fields"]:
+            if field.name not in values:
+                continue  # No value in the schedule, leave both sides alone
+            ms_value, jira_value, base_value = values[field.name], field.jira_value(fields), base.get(field.name)
+
+            if field.same(ms_value, jira_value):
+                staged[field.name] = ms_value
+            elif (base_value is None or not field.writable
+                  or (not field.same(ms_value, base_value) and field.same(jira_value, base_value))):
+                to_jira[field.jira_field] = {"from": jira_value, "to": ms_value}
+                staged[field.name] = ms_value
+            elif field.same(ms_value, base_value) and jira_value is not None:
+                to_schedule[field.element] = field.to_schedule(jira_value, task["values"][field.name])
+                print(issue_key, ":", f"{field.element} changed in Jira from {base_value} to {jira_value}")
+            else:
+                conflicts.append({"issue": issue_key, "name": task["name"], "field": field.jira_field,
+                                  "schedule": ms_value, "jira": jira_value, "last_synced": base_value})
+                print(issue_key, ":", f"conflict on {field.jira_field}: schedule {ms_value}, Jira {jira_value}, "
+                      f"last synced {base_value}")
+
+        snapshot.stage(issue_key, staged)
+        if to_jira:
+            changes.append({"issue": issue_key, "name": task["name"], "fields": to_jira})
+        if to_schedule:
+            schedule_updates[issue_key] = to_schedule
+        if not to_jira and not to_schedule and len(staged) == len(values):
+            unchanged.append(issue_key)
+    return changes, schedule_updates, conflicts, unchanged
+
+
+def reconcile_schedule(jira, schedule_file, output_file, mapping, snapshot, batch_size=100, dry_run=False):
+    """
+    Reconciles every task of the schedule with Jira (see plan_reconciliation)
+    and writes the Jira-side changes into a copy of the schedule at
+    output_file, unless dry_run is set.
+
+    Returns:
+        tuple: (changes, unchanged, conflicts, schedule_updates).
+    """
+    tasks = read_schedule_tasks(schedule_file, mapping)
+    print(f"Found {len(tasks)} task(s) linked to Jira issues.")
+    jira_issues = prefetch_jira_fields(jira, [task["issue_key"] for task in tasks], mapping.jira_fields, batch_size)
+
+    changes, schedule_updates, conflicts, unchanged = plan_reconciliation(tasks, jira_issues, snapshot)
+    print(f"{len(changes)} issue(s) to update in Jira, {len(schedule_updates)} task(s) to update in the schedule, "
+          f"{len(conflicts)} conflict(s), {len(unchanged)} already in sync.")
+
+    if schedule_updates and not dry_run:
+        written = write_schedule_updates(schedule_file, output_file, schedule_updates, mapping.issue_key)
+        print(f"Wrote {len(written)} updated task(s) to '{output_file}'. Import it into MS Project before the next sync.")
+    return changes, unchanged, conflicts, schedule_updates
+
+
+def read_typed_change_set(filepath, mapping):
+    """
+    Reads a change set and converts the planned values of mapped fields to
+    their field type, so values from a CSV change set are sent (and
+    snapshotted) as numbers where the planning phase had numbers.
+    """
+    changes = read_change_set(filepath)
+    for change in changes:
+        for jira_field, values in change["fields"].items():
+            field = mapping.field_by_jira_field(jira_field)
+            if field is not None:
+                values["from"] = field.from_change_set(values.get("from"))
+                values["to"] = field.from_change_set(values["to"])
+    return changes
+
+
+def apply_changes(changes, updater, mapping):
+    """Queues every change on the updater (a JiraUpdateExecutor), one update per issue."""
+    for change in changes:
+        updater.submit(change["issue"], mapping.payload({field: values["to"] for field, values in change["fields"].items()}))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sync MS Project task dates (or the fields mapped in the "
+                                                 "[SYNC] sections of the configuration) to Jira issues.")
+    parser.add_argument("schedule", nargs="?", default="SAFAR Project Schedule.xml",
+                        help="MS Project XML export (default: 'SAFAR Project Schedule.xml')")
+    parser.add_argument("-c", "--config", default="scribe.cfg",
+                        help="Configuration file (default: scribe.cfg)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--plan", metavar="CHANGE_SET",
+                      help="Only write the required changes to CHANGE_SET (.json or .csv), and the values to record in "
+                           "the snapshot on --apply to CHANGE_SET.sync.json; Jira is not modified")
+    mode.add_argument("--apply", metavar="CHANGE_SET",
+                      help="Apply a change set written by --plan, without reading the schedule or Jira")
+    parser.add_argument("--reconcile", metavar="OUTPUT_XML",
+                        help="Sync both ways: push schedule changes to Jira, write Jira-side changes into "
+                             "OUTPUT_XML (a copy of the schedule) and report conflicts; compares every task")
+    parser.add_argument("-b", "--batch-size", type=int, default=100,
+                        help="Issue keys per JQL search when prefetching Jira fields (default: 100)")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="Number of issues updated in parallel (default: 4)")
+    parser.add_argument("-r", "--rate", type=float, default=10.0,
+                        help="Maximum Jira update requests per second, retries included (default: 10)")
+    parser.add_argument("--retries", type=int, default=5,
+                        help="Retries per update on 429, 5xx and connection errors (default: 5)")
+    parser.add_argument("-s", "--snapshot", default="sync_snapshot.db",
+                        help="SQLite snapshot of the last synced schedule values (default: sync_snapshot.db)")
+    parser.add_argument("--full", action="store_true",
+                        help="Compare every task with Jira, not only the ones changed since the last sync "
+                             "(catches values edited directly in Jira)")
+    parser.add_argument("--report", default="sync_report.json",
+                        help="JSON report of updated, unchanged and failed issues (default: sync_report.json)")
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate must be greater than 0 requests per second")
+    if args.reconcile and args.apply:
+        parser.error("--reconcile reads the schedule and Jira, it cannot be combined with --apply")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Read the configuration once; every request reuses the client's session
+    jcfg = read_config(args.config)
+    mapping = read_sync_mapping(args.config, jcfg['PROJECT_KEY'])
+    with JiraClient.from_config(jcfg, pool_size=args.workers) as jira, SyncSnapshot(args.snapshot) as snapshot:
+        if args.apply:
+            changes = read_typed_change_set(args.apply, mapping)
+            # The schedule values of the plan, so the snapshot also covers the issues already in sync
+            synced_values, unchanged = read_sync_values(args.apply)
+            print(f"Applying {len(changes)} change(s) from '{args.apply}'.")
+            if not synced_values:
+                print(f"No '{sync_values_path(args.apply)}' found: only the changed fields are recorded in the snapshot.")
+            for issue_key, values in synced_values.items():
+                snapshot.stage(issue_key, values)
+            for change in changes:
+                mapped = {mapping.field_by_jira_field(field): values["to"] for field, values in change["fields"].items()}
+                snapshot.stage(change["issue"], {field.name: value for field, value in mapped.items() if field is not None})
+        elif args.reconcile:
+            changes, unchanged, conflicts, schedule_updates = reconcile_schedule(
+                jira, args.schedule, args.reconcile, mapping, snapshot, args.batch_size, dry_run=bool(args.plan))
         else:
-            print(issue_key, ' Need update: from', j_end_date, 'to', ms_finish[:10])
-            
-        update_jira_fields(issue_key, ms_start[:10], ms_finish[:10])
-
-        # Debugging exit after the first cycle .
-        # exit()
-    	
-	
+            changes, unchanged = plan_schedule(jira, args.schedule, mapping, args.batch_size, snapshot, args.full)
+
+        if args.plan:
+            write_change_set(args.plan, changes, args.schedule)
+            write_sync_values(args.plan, snapshot.staged([change["issue"] for change in changes] + unchanged), unchanged)
+            print(f"Change set written to '{args.plan}'.")
+            sys.exit(0)
+
+        with JiraUpdateExecutor(jira, workers=args.workers, rate=args.rate, retries=args.retries) as updater:
+            for issue_key in unchanged:
+                updater.record_unchanged(issue_key)
+            apply_changes(changes, updater, mapping)
+
+        extra = None
+        if args.reconcile:
+            extra = {"conflicts": conflicts,
+                     "schedule_updates": [{"issue": key, "fields": fields} for key, fields in sorted(schedule_updates.items())]}
+        report = updater.write_report(args.report, extra)
+        # Only issues now known to match the schedule; failed ones are retried next run
+        snapshot.save(report["unchanged"] + [entry["issue"] for entry in report["updated"]])
+
+    summary = report["summary"]
+    print(f"Updated {summary['updated']}, unchanged {summary['unchanged']}, failed {summary['failed']} issue(s). "
+          f"Report written to '{args.report}'.")
+    for failure in report["failed"]:
+        print(f"  Failed: {failure['issue']}: {failure['status']} - {failure['reason']}")
+    for conflict in report.get("conflicts", []):
+        print(f"  Conflict: {conflict['issue']} {conflict['field']}: schedule {conflict['schedule']}, "
+              f"Jira {conflict['jira']}, last synced {conflict['last_synced']}")
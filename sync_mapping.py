@@ -0,0 +1,316 @@
+# sync_mapping.py
+
+# Declarative MS Project -> Jira field mapping for sync_dates.py.
+#
+# Which schedule elements are synced to which Jira fields, how the values
+# are converted, how a task finds its issue and which fields are synced at
+# each outline level are read from scribe.cfg, so new fields do not need a
+# new script. All fields of an issue are sent in a single update.
+#
+#   [SYNC]
+#   ISSUE_KEY_ELEMENT = Notes          ; task element holding the issue number (or full key)
+#   ISSUE_KEY_PREFIX  = SAF-           ; default: the JIRA PROJECT_KEY and '-'
+#   FIELDS            = start, finish  ; fields synced at levels without their own rule
+#
+#   [SYNC_FIELD start]
+#   ELEMENT    = Start                 ; direct child of <Task>, or e.g. Baseline[0]/Finish
+#   JIRA_FIELD = customfield_10015     ; dotted for nested fields, e.g. timetracking.remainingEstimate
+#   TYPE       = date                  ; date, string, integer, number, hours or duration
+#
+#   [SYNC_LEVEL 3]
+#   TYPE   = Work Package
+#   FIELDS = start, finish             ; empty: tasks at this level are not synced
+#
+# Without any [SYNC...] section the mapping is the original one: Start and
+# Finish to customfield_10015 and duedate, levels 3 to 6 typed Work Package,
+# Epic, Story and Task.
+
+import re
+import sys
+import configparser
+
+START_DATE_FIELD = "customfield_10015"
+DUE_DATE_FIELD = "duedate"
+
+DEFAULT_FIELDS = (
+    ("start", "Start", START_DATE_FIELD, "date"),
+    ("finish", "Finish", DUE_DATE_FIELD, "date"),
+)
+DEFAULT_LEVEL_TYPES = {3: "Work Package", 4: "Epic", 5: "Story", 6: "Task"}
+
+ELEMENT_PATTERN = re.compile(r"^(\w+)(?:\[(\d+)\])?(?:/(\w+))?$")
+ISO_DURATION_PATTERN = re.compile(r"^PT(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?$")
+JIRA_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*([wdhm])")
+ISSUE_KEY_PATTERN = re.compile(r"^[A-Z][A-Z0-9_]*-\d+$")
+
+# Jira time tracking defaults: 8 hour days, 5 day weeks
+JIRA_DURATION_MINUTES = {"w": 5 * 8 * 60, "d": 8 * 60, "h": 60, "m": 1}
+
+
+def parse_element(element):
+    """
+    Splits an element spec into (tag, baseline number, child tag):
+    'Start' -> ('Start', None, None), 'Baseline[0]/Finish' -> ('Baseline', '0', 'Finish').
+    """
+    match = ELEMENT_PATTERN.match(element)
+    if match is None:
+        raise ValueError(f"Invalid schedule element '{element}'")
+    return match.group(1), match.group(2), match.group(3)
+
+
+def iso_duration_minutes(value):
+    """MS Project durations look like 'PT12H30M0S'; returns the minutes, or None."""
+    match = ISO_DURATION_PATTERN.match(value.strip())
+    if match is None or not any(match.groups()):
+        return None
+    hours, minutes, seconds = (float(group or 0) for group in match.groups())
+    return round(hours * 60 + minutes + seconds / 60)
+
+
+def jira_duration_minutes(value):
+    """Jira time tracking values look like '1d 4h 30m'; returns the minutes, or None."""
+    parts = JIRA_DURATION_PATTERN.findall(str(value))
+    if not parts:
+        return None
+    return round(sum(float(amount) * JIRA_DURATION_MINUTES[unit] for amount, unit in parts))
+
+
+def format_jira_duration(minutes):
+    hours, minutes = divmod(minutes, 60)
+    return " ".join(part for part in (f"{hours}h" if hours else "", f"{minutes}m" if minutes else "") if part) or "0m"
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+class FieldMapping:
+    """
+    One schedule element synced to one Jira field.
+
+    Parameters:
+    name       : str, name used in the level rules, reports and the snapshot
+    element    : str, schedule element, e.g. 'Start' or 'Baseline[0]/Finish'
+    jira_field : str, Jira field ID, dotted for nested fields
+    type       : str, value conversion: date, string, integer, number, hours or duration
+    """
+
+    TYPES = ("date", "string", "integer", "number", "hours", "duration")
+
+    def __init__(self, name, element, jira_field, type="string"):
+        if type not in self.TYPES:
+            raise ValueError(f"Unknown type '{type}' of field '{name}' (expected one of {', '.join(self.TYPES)})")
+        parse_element(element)
+        self.name = name
+        self.element = element
+        self.jira_field = jira_field
+        self.type = type
+
+    @property
+    def writable(self):
+        """True if a Jira value can be written back into the schedule element."""
+        return "/" not in self.element and self.type in ("date", "string", "integer", "number")
+
+    def to_jira(self, text):
+        """Converts the schedule text to the Jira value, or None if there is nothing to sync."""
+        if text is None or text.strip() in ("", "N/A"):
+            return None
+        text = text.strip()
+        if self.type == "date":
+            return text[:10]
+        if self.type == "integer":
+            number = _number(text)
+            return round(number) if number is not None else None
+        if self.type == "number":
+            return _number(text)
+        if self.type in ("hours", "duration"):
+            minutes = iso_duration_minutes(text)
+            if minutes is None:
+                return None
+            return round(minutes / 60, 2) if self.type == "hours" else format_jira_duration(minutes)
+        return text
+
+    def from_change_set(self, value):
+        """
+        Restores the type of a planned Jira value read back from a change set;
+        CSV change sets hold every value as text.
+        """
+        if value is None or value == "":
+            return None
+        if self.type == "integer":
+            number = _number(value)
+            return round(number) if number is not None else None
+        if self.type in ("number", "hours"):
+            return _number(value)
+        return str(value)
+
+    def jira_value(self, fields):
+        """Reads this field out of the 'fields' of a Jira issue."""
+        value = fields
+        for part in self.jira_field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(value, dict):
+            # Option and user fields: compare their display value
+            value = value.get("value", value.get("name"))
+        return value
+
+    def normalize(self, value):
+        """Brings a Jira or converted schedule value into a comparable form."""
+        if value is None or value == "":
+            return None
+        if self.type == "date":
+            return str(value)[:10]
+        if self.type in ("integer", "number", "hours"):
+            return _number(value)
+        if self.type == "duration":
+            return jira_duration_minutes(value)
+        return str(value).strip()
+
+    def same(self, schedule_value, jira_value):
+        return self.normalize(schedule_value) == self.normalize(jira_value)
+
+    def to_schedule(self, jira_value, text):
+        """Converts a Jira value back to schedule text, keeping the time of day of dates."""
+        if self.type == "date":
+            return str(jira_value)[:10] + (text or "")[10:]
+        if self.type == "integer":
+            return str(round(float(jira_value)))
+        return str(jira_value)
+
+
+class SyncMapping:
+    """
+    The fields to sync, how tasks map to issues and the per-level rules.
+
+    Parameters:
+    fields            : list of FieldMapping
+    issue_key_element : str, task element holding the issue number or key (default: 'Notes')
+    issue_key_prefix  : str, prepended to bare issue numbers (default: 'SAF-')
+    levels            : dict, outline level -> {'type': str or None, 'fields': list of field names};
+                        levels without a rule sync default_fields
+    default_fields    : list of field names (default: all fields)
+    """
+
+    def __init__(self, fields, issue_key_element="Notes", issue_key_prefix="SAF-", levels=None, default_fields=None):
+        self.fields = {field.name: field for field in fields}
+        self.issue_key_element = issue_key_element
+        self.issue_key_prefix = issue_key_prefix
+        self.levels = levels or {}
+        self.default_fields = list(default_fields) if default_fields is not None else list(self.fields)
+        for rule in [{"fields": self.default_fields}, *self.levels.values()]:
+            unknown = [name for name in rule["fields"] if name not in self.fields]
+            if unknown:
+                raise ValueError(f"Unknown field(s) {', '.join(unknown)} in the sync level rules")
+
+    @property
+    def elements(self):
+        """Schedule elements the task reader has to collect."""
+        return list(dict.fromkeys([self.issue_key_element, *(field.element for field in self.fields.values())]))
+
+    @property
+    def jira_fields(self):
+        """Top-level Jira fields to request when prefetching issues."""
+        return list(dict.fromkeys(field.jira_field.split(".")[0] for field in self.fields.values()))
+
+    def issue_key(self, values):
+        """Returns the issue key of a task from its element values, or None if it is not linked."""
+        text = (values.get(self.issue_key_element) or "").strip()
+        if ISSUE_KEY_PATTERN.match(text):
+            return text
+        if re.fullmatch(r"\d+(\.0*)?", text):
+            return f"{self.issue_key_prefix}{int(float(text))}"
+        return None
+
+    def level_rule(self, outline_level):
+        """Returns (task type, list of FieldMapping) for an outline level."""
+        try:
+            level = int(outline_level)
+        except (TypeError, ValueError):
+            level = None
+        rule = self.levels.get(level, {"type": None, "fields": self.default_fields})
+        return rule["type"], [self.fields[name] for name in rule["fields"]]
+
+    def field_by_jira_field(self, jira_field):
+        return next((field for field in self.fields.values() if field.jira_field == jira_field), None)
+
+    def payload(self, values):
+        """
+        Builds the 'fields' of one Jira update from Jira field ID -> value,
+        nesting dotted IDs (e.g. timetracking.remainingEstimate).
+        """
+        payload = {}
+        for jira_field, value in values.items():
+            *parents, leaf = jira_field.split(".")
+            target = payload
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = value
+        return payload
+
+
+def default_mapping(project_key="SAF"):
+    levels = {level: {"type": task_type, "fields": [name for name, _, _, _ in DEFAULT_FIELDS]}
+              for level, task_type in DEFAULT_LEVEL_TYPES.items()}
+    return SyncMapping([FieldMapping(*field) for field in DEFAULT_FIELDS],
+                       issue_key_prefix=f"{project_key}-", levels=levels)
+
+
+def _split_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def read_sync_mapping(config_file='scribe.cfg', project_key="SAF"):
+    """
+    Reads the [SYNC], [SYNC_FIELD <name>] and [SYNC_LEVEL <n>] sections of
+    the configuration file; see the top of this module.
+
+    Returns:
+        SyncMapping: The configured mapping, or the default one.
+    """
+    config = configparser.ConfigParser()
+    try:
+        with open(config_file) as f:
+            config.read_file(f)
+    except Exception as e:
+        print(f"Error reading configuration file '{config_file}': {e}")
+        sys.exit(1)
+
+    field_sections = [section for section in config.sections() if section.startswith("SYNC_FIELD ")]
+    level_sections = [section for section in config.sections() if section.startswith("SYNC_LEVEL ")]
+    if not field_sections and not level_sections and not config.has_section("SYNC"):
+        return default_mapping(project_key)
+
+    try:
+        if field_sections:
+            fields = [FieldMapping(section.split(None, 1)[1].strip(),
+                                   config.get(section, "ELEMENT").strip(),
+                                   config.get(section, "JIRA_FIELD").strip(),
+                                   config.get(section, "TYPE", fallback="string").strip().lower())
+                      for section in field_sections]
+        else:
+            fields = [FieldMapping(*field) for field in DEFAULT_FIELDS]
+
+        levels = {}
+        for section in level_sections:
+            levels[int(section.split(None, 1)[1])] = {
+                "type": config.get(section, "TYPE", fallback="").strip() or None,
+                "fields": _split_list(config.get(section, "FIELDS", fallback=",".join(f.name for f in fields))),
+            }
+        if not level_sections and not field_sections:
+            levels = default_mapping(project_key).levels
+
+        default_fields = None
+        if config.has_option("SYNC", "FIELDS"):
+            default_fields = _split_list(config.get("SYNC", "FIELDS"))
+
+        return SyncMapping(fields,
+                           issue_key_element=config.get("SYNC", "ISSUE_KEY_ELEMENT", fallback="Notes").strip(),
+                           issue_key_prefix=config.get("SYNC", "ISSUE_KEY_PREFIX", fallback=f"{project_key}-").strip(),
+                           levels=levels, default_fields=default_fields)
+    except (configparser.Error, ValueError) as e:
+        print(f"Error in the sync mapping of '{config_file}': {e}")
+        sys.exit(1)
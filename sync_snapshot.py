@@ -0,0 +1,99 @@
+# sync_snapshot.py
+
+# Local record of the schedule values sync_dates.py last brought Jira in
+# line with, so an incremental run only has to look at the tasks whose
+# values changed in MS Project since then.
+#
+# The snapshot is a small SQLite database:
+#   issues(issue_key TEXT PRIMARY KEY, fields TEXT, synced_at TEXT)
+# with 'fields' a JSON object of mapped field name -> synced value (see
+# sync_mapping.py), e.g. {"start": "2025-03-04", "finish": "2025-04-08"}.
+# Values are staged while a run plans its changes and written only for the
+# issues that ended up in sync, so a failed update is looked at again on the
+# next run.
+
+import json
+import sqlite3
+import datetime
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    issue_key TEXT PRIMARY KEY,
+    fields    TEXT,
+    synced_at TEXT
+)
+"""
+
+
+class SyncSnapshot:
+    """
+    Last synced schedule values per Jira issue.
+
+    Parameters:
+    filepath : str, the SQLite database file (created if missing)
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._db = sqlite3.connect(filepath)
+        self._db.execute(SNAPSHOT_SCHEMA)
+        self._migrate()
+        self.issues = {key: json.loads(fields or "{}") for key, fields
+                       in self._db.execute("SELECT issue_key, fields FROM issues")}
+        self._staged = {}
+
+    def _migrate(self):
+        # Snapshots of the dates-only sync kept one column per date
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(issues)")]
+        if "fields" in columns:
+            return
+        with self._db:
+            self._db.execute("ALTER TABLE issues ADD COLUMN fields TEXT")
+            rows = self._db.execute("SELECT issue_key, start, finish FROM issues").fetchall()
+            self._db.executemany("UPDATE issues SET fields = ? WHERE issue_key = ?",
+                                 [(json.dumps({"start": start, "finish": finish}), key) for key, start, finish in rows])
+
+    def values(self, issue_key):
+        """Returns field name -> value of the last sync of an issue ({} if never synced)."""
+        return self.issues.get(issue_key, {})
+
+    def is_current(self, issue_key, values):
+        """True if the issue was last synced with exactly these values (field name -> value)."""
+        synced = self.issues.get(issue_key)
+        return synced is not None and all(synced.get(name) == value for name, value in values.items())
+
+    def stage(self, issue_key, values):
+        """
+        Remembers the values an issue is being synced to; fields missing
+        from values keep their stored value (e.g. when a change set only
+        sets one of them).
+        """
+        self._staged.setdefault(issue_key, {}).update(values)
+
+    def staged(self, issue_keys):
+        """The values staged for the given issues: issue key -> field name -> value."""
+        return {key: dict(self._staged[key]) for key in issue_keys if key in self._staged}
+
+    def save(self, synced_keys):
+        """Writes the staged values of the issues that are now in sync with the schedule."""
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        rows = []
+        for key in synced_keys:
+            if key in self._staged:
+                self.issues[key] = {**self.issues.get(key, {}), **self._staged[key]}
+                rows.append((key, json.dumps(self.issues[key], sort_keys=True), now))
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO issues (issue_key, fields, synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(issue_key) DO UPDATE SET fields = excluded.fields, synced_at = excluded.synced_at", rows)
+        self._staged.clear()
+        print(f"Saved sync snapshot of {len(rows)} issue(s) to '{self.filepath}'.")
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
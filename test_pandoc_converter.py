@@ -0,0 +1,33 @@
+# test_pandoc_converter.py
+
+# Batched pandoc conversions must give every page the LaTeX it gets when
+# converted on its own. Needs pandoc (pypandoc-binary ships it).
+#
+# Usage:
+#   python -m pytest test_pandoc_converter.py
+
+from pandoc_converter import (convert_html, convert_html_batch, heading_identifiers,
+                              split_on_shared_identifiers)
+
+PANDOC_ARGS = ['--wrap=none']
+
+INTRODUCTION_PAGE = '<h2>Introduction</h2><p>See the <a href="#introduction">introduction</a>.</p>'
+
+
+def test_same_heading_batched_like_unbatched():
+    pages = [INTRODUCTION_PAGE, INTRODUCTION_PAGE.replace("See the", "Read the")]
+    batched = convert_html_batch(pages, PANDOC_ARGS)
+    assert batched == [convert_html(page, PANDOC_ARGS) for page in pages]
+    assert all(r"\label{introduction}" in latex for latex in batched)
+
+
+def test_pages_without_shared_headings_stay_in_one_run():
+    pages = [INTRODUCTION_PAGE, "<h2>Scope</h2><h3>Scope</h3>", "<h2>Scope 1</h2>", "<p>No headings</p>"]
+    assert [len(run) for run in split_on_shared_identifiers(pages)] == [2, 2]
+    assert convert_html_batch(pages, PANDOC_ARGS) == [convert_html(page, PANDOC_ARGS) for page in pages]
+
+
+def test_heading_identifiers():
+    assert heading_identifiers('<h1 id="custom">Title</h1><h2>1. Scope &amp; <b>Purpose</b></h2>'
+                               '<h2>Scope &amp; Purpose</h2><h3>***</h3>') == \
+        {"custom", "scope-purpose", "scope-purpose-1", "section"}